@@ -0,0 +1,342 @@
+import asyncio
+import random
+import threading
+import time
+from collections import defaultdict, deque
+
+from config import Config
+import profiling
+
+# Shared layer in front of every Groq call: one client, an overall deadline per
+# call, jittered retries on transient errors, a token bucket sized to the API
+# quota and a circuit breaker. Callers keep their own fallbacks (empty plan,
+# default quote, ...) and simply catch the exceptions raised here.
+
+AI_CALL_TIMEOUT = Config.AI_CALL_TIMEOUT
+
+# HTTP statuses worth another attempt; anything else (bad request, auth) is not
+RETRYABLE_STATUSES = (408, 409, 429, 500, 502, 503, 504)
+
+
+class AIUnavailableError(Exception):
+    """Raised without calling Groq when the breaker is open or the quota is exhausted."""
+
+
+class RateLimiter:
+    """Token bucket: allows `rate_per_minute` calls on average with bursts up to `burst`."""
+
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst or max(1, int(rate_per_minute // 6))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self):
+        """Takes a token and returns 0, or returns how long until one is available."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self, timeout=None):
+        """Blocks until a token is available. Returns False if that would take longer than `timeout`."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    async def acquire_async(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failed calls and rejects calls for
+    `reset_timeout` seconds. Then lets one trial call through (half-open):
+    success closes the breaker, failure opens it again.
+    """
+
+    def __init__(self, threshold=5, reset_timeout=30):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def release(self):
+        """Gives back an admitted call that never reached Groq."""
+        with self._lock:
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+
+class _FunctionMetrics:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latencies = deque(maxlen=500)
+        # Request threads and the plan/quote workers update the same counters
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for field, n in counts.items():
+                setattr(self, field, getattr(self, field) + n)
+
+    def observe(self, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            calls, errors, retries, timeouts, rejected = self.calls, self.errors, self.retries, self.timeouts, self.rejected
+            prompt_tokens, completion_tokens = self.prompt_tokens, self.completion_tokens
+            latencies = sorted(self.latencies)
+
+        def pct(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1) if latencies else None
+
+        return {
+            'calls': calls,
+            'errors': errors,
+            'error_rate': errors / calls if calls else 0.0,
+            'retries': retries,
+            'timeouts': timeouts,
+            'rejected': rejected,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'latency_ms_p50': pct(0.50),
+            'latency_ms_p95': pct(0.95),
+        }
+
+
+_client = None
+_limiter = None
+_breaker = None
+_settings = {}
+_metrics = defaultdict(_FunctionMetrics)
+_lock = threading.Lock()
+
+
+def configure(timeout=Config.AI_CALL_TIMEOUT, max_retries=Config.AI_MAX_RETRIES, rate_per_minute=Config.AI_RATE_PER_MINUTE,
+              breaker_threshold=Config.AI_BREAKER_THRESHOLD, breaker_reset=Config.AI_BREAKER_RESET):
+    global _limiter, _breaker
+    with _lock:
+        _settings.update(timeout=timeout, max_retries=max_retries)
+        _limiter = RateLimiter(rate_per_minute)
+        _breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+
+
+def _get_metrics(name):
+    with _lock:
+        return _metrics[name]
+
+
+def _ensure_configured():
+    if _breaker is None:
+        configure()
+
+
+def get_client():
+    """Creates the Groq client on first use. Retries are ours, so the SDK's own are off."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import groq
+                _client = groq.Client(api_key=Config.GROQ_API_KEY, base_url=Config.GROQ_BASE_URL, max_retries=0)
+    return _client
+
+
+def get_async_client():
+    """A new AsyncClient; use it as an async context manager within one event loop."""
+    import groq
+    return groq.AsyncClient(api_key=Config.GROQ_API_KEY, base_url=Config.GROQ_BASE_URL, max_retries=0)
+
+
+def _is_timeout(e):
+    import groq
+    return isinstance(e, (groq.APITimeoutError, asyncio.TimeoutError))
+
+
+def _is_retryable(e):
+    import groq
+    if isinstance(e, (groq.APIConnectionError, asyncio.TimeoutError)):
+        return True
+    return getattr(e, 'status_code', None) in RETRYABLE_STATUSES
+
+
+def _backoff(attempt, error, remaining):
+    """Full-jitter exponential backoff, honouring Retry-After, never past the deadline."""
+    delay = random.uniform(0, min(8.0, 0.5 * 2 ** attempt))
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    if retry_after:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            pass
+    return delay if delay < remaining else None
+
+
+def _record_usage(metrics, response):
+    usage = getattr(response, 'usage', None)
+    if usage is not None:
+        metrics.add(prompt_tokens=getattr(usage, 'prompt_tokens', 0) or 0,
+                    completion_tokens=getattr(usage, 'completion_tokens', 0) or 0)
+
+
+def _admit(name, metrics):
+    metrics.add(calls=1)
+    if not _breaker.allow():
+        metrics.add(rejected=1)
+        raise AIUnavailableError(f"AI circuit open, skipping {name}")
+
+
+def _fail(metrics, error):
+    metrics.add(errors=1, timeouts=1 if _is_timeout(error) else 0)
+    # Only upstream trouble counts towards opening the breaker; a 4xx for our
+    # own bad request still means Groq is up
+    if _is_retryable(error):
+        _breaker.record_failure()
+    else:
+        _breaker.record_success()
+
+
+@profiling.timed('ai')
+def chat_completion(name, timeout=None, **request_kwargs):
+    """
+    Runs chat.completions.create(**request_kwargs) under the shared policy.
+    `name` labels the metrics; `timeout` is the overall deadline including
+    retries. Raises AIUnavailableError or the last Groq error on failure.
+    """
+    _ensure_configured()
+    metrics = _get_metrics(name)
+    _admit(name, metrics)
+    deadline = time.monotonic() + (timeout or _settings['timeout'])
+    attempt = 0
+    while True:
+        remaining = deadline - time.monotonic()
+        if not _limiter.acquire(timeout=remaining):
+            metrics.add(rejected=1)
+            _breaker.release()
+            raise AIUnavailableError(f"AI rate limit reached, skipping {name}")
+        started = time.monotonic()
+        try:
+            response = get_client().chat.completions.create(
+                timeout=max(0.1, deadline - time.monotonic()), **request_kwargs
+            )
+        except Exception as e:
+            delay = None
+            if attempt < _settings['max_retries'] and _is_retryable(e):
+                delay = _backoff(attempt, e, deadline - time.monotonic())
+            if delay is None:
+                _fail(metrics, e)
+                raise
+            attempt += 1
+            metrics.add(retries=1)
+            time.sleep(delay)
+            continue
+        metrics.observe(time.monotonic() - started)
+        _breaker.record_success()
+        if not request_kwargs.get('stream'):
+            _record_usage(metrics, response)
+        return response
+
+
+async def chat_completion_async(name, client, timeout=None, **request_kwargs):
+    """chat_completion for an AsyncClient; the deadline also cancels the in-flight request."""
+    _ensure_configured()
+    metrics = _get_metrics(name)
+    _admit(name, metrics)
+    deadline = time.monotonic() + (timeout or _settings['timeout'])
+    attempt = 0
+    while True:
+        remaining = deadline - time.monotonic()
+        if not await _limiter.acquire_async(timeout=remaining):
+            metrics.add(rejected=1)
+            _breaker.release()
+            raise AIUnavailableError(f"AI rate limit reached, skipping {name}")
+        started = time.monotonic()
+        try:
+            response = await asyncio.wait_for(
+                client.chat.completions.create(**request_kwargs),
+                max(0.1, deadline - time.monotonic())
+            )
+        except Exception as e:
+            delay = None
+            if attempt < _settings['max_retries'] and _is_retryable(e):
+                delay = _backoff(attempt, e, deadline - time.monotonic())
+            if delay is None:
+                _fail(metrics, e)
+                raise
+            attempt += 1
+            metrics.add(retries=1)
+            await asyncio.sleep(delay)
+            continue
+        metrics.observe(time.monotonic() - started)
+        _breaker.record_success()
+        _record_usage(metrics, response)
+        return response
+
+
+def stats():
+    _ensure_configured()
+    with _lock:
+        functions = list(_metrics.items())
+    return {
+        'breaker': _breaker.state,
+        'functions': {name: m.snapshot() for name, m in functions},
+    }
@@ -1,12 +1,11 @@
-import os
-import groq
+import asyncio
 from datetime import datetime, timedelta
-from config import Config
 from database import db
+from reporting import weekly_summary_data
+import ai_client
+import profiling
 import json
 
-client = groq.Client(api_key=Config.GROQ_API_KEY)
-
 def get_recent_meals(user_id):
     """Helper function to get meals from the database."""
     return db.execute_query(
@@ -27,12 +26,12 @@ def get_recent_workouts(user_id):
         fetch_all=True
     ) or []
 
-def get_ai_diet_suggestion(user, prompt=""):
-    try:
-        recent_meals = get_recent_meals(user.id)
-        
-        # --- MODIFIED: Added medical history to the context ---
-        context = f"""
+def _diet_request(user):
+    """Builds the chat-completion arguments for a one-day meal plan."""
+    recent_meals = get_recent_meals(user.id)
+
+    # --- MODIFIED: Added medical history to the context ---
+    context = f"""
         User Profile:
         - Age: {user.age}, Gender: {user.gender}
         - Weight: {user.weight} kg, Height: {user.height} cm
@@ -44,8 +43,8 @@ def get_ai_diet_suggestion(user, prompt=""):
         - Recent Meals: {[f"{meal['name']} ({meal['calories']} cal)" for meal in recent_meals]}
         """
 
-        # --- MODIFIED: Updated system prompt ---
-        system_prompt = """You are a cautious and responsible diet planning AI. Your ONLY job is to create a one-day meal plan.
+    # --- MODIFIED: Updated system prompt ---
+    system_prompt = """You are a cautious and responsible diet planning AI. Your ONLY job is to create a one-day meal plan.
         **CRITICAL RULES:**
         1. You MUST carefully consider the user's medical conditions and diet preferences. For example, for high blood pressure, suggest low-sodium foods.
         2. You MUST respond in the format: `MealType:FoodName:Calories;MealType:FoodName:Calories`.
@@ -54,29 +53,35 @@ def get_ai_diet_suggestion(user, prompt=""):
         **EXAMPLE RESPONSE:**
         Breakfast:Oatmeal with Berries:350;Lunch:Grilled Chicken Salad:450;Dinner:Salmon with Quinoa:550
         """
-        
-        response = client.chat.completions.create(
-            model="llama3-8b-8192",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": context}
-            ],
-            temperature=0.5,
-            max_tokens=200
-        )
-        ai_response = response.choices[0].message.content
-        return "" if ai_response.strip() == "None" else ai_response
 
+    return dict(
+        model="llama3-8b-8192",
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": context}
+        ],
+        temperature=0.5,
+        max_tokens=200
+    )
+
+def _parse_plan(response):
+    ai_response = response.choices[0].message.content
+    return "" if ai_response.strip() == "None" else ai_response
+
+def get_ai_diet_suggestion(user, prompt=""):
+    try:
+        response = ai_client.chat_completion('diet', **_diet_request(user))
+        return _parse_plan(response)
     except Exception as e:
         print(f"AI Diet Suggestion Error: {str(e)}")
         return ""
 
-def get_ai_workout_plan(user, prompt=""):
-    try:
-        recent_workouts = get_recent_workouts(user.id)
+def _workout_request(user):
+    """Builds the chat-completion arguments for a one-day workout plan."""
+    recent_workouts = get_recent_workouts(user.id)
 
-        # --- MODIFIED: Added medical history to the context ---
-        context = f"""
+    # --- MODIFIED: Added medical history to the context ---
+    context = f"""
         User Profile:
         - Name: {user.name}, Age: {user.age}, Gender: {user.gender}
         - Weight: {user.weight} kg, Height: {user.height} cm
@@ -87,8 +92,8 @@ def get_ai_workout_plan(user, prompt=""):
         - Recent Workouts: {[f"{workout['type']} ({workout['duration']} min)" for workout in recent_workouts]}
         """
 
-        # --- MODIFIED: Updated system prompt ---
-        system_prompt = """You are a cautious and responsible personal trainer AI. Your ONLY job is to create a one-day workout plan.
+    # --- MODIFIED: Updated system prompt ---
+    system_prompt = """You are a cautious and responsible personal trainer AI. Your ONLY job is to create a one-day workout plan.
         **CRITICAL RULES:**
         1. You MUST create a safe workout that considers the user's medical conditions and past injuries. Avoid any exercises that could cause harm or strain.
         2. You MUST respond in the format: `Category:ExerciseName:CaloriesBurned;Category:ExerciseName:CaloriesBurned`.
@@ -97,17 +102,20 @@ def get_ai_workout_plan(user, prompt=""):
         **EXAMPLE RESPONSE:**
         Cardio:Brisk Walking:250;Strength:Bodyweight Squats:100;Flexibility:Gentle Stretching:50
         """
-        response = client.chat.completions.create(
-            model="llama3-8b-8192",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": context}
-            ],
-            temperature=0.5,
-            max_tokens=200
-        )
-        ai_response = response.choices[0].message.content
-        return "" if ai_response.strip() == "None" else ai_response
+    return dict(
+        model="llama3-8b-8192",
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": context}
+        ],
+        temperature=0.5,
+        max_tokens=200
+    )
+
+def get_ai_workout_plan(user, prompt=""):
+    try:
+        response = ai_client.chat_completion('workout', **_workout_request(user))
+        return _parse_plan(response)
     except Exception as e:
         print(f"AI Workout Plan Error: {str(e)}")
         return ""
@@ -115,7 +123,8 @@ def get_ai_workout_plan(user, prompt=""):
 def get_nutrition_info(food_name: str) -> dict:
     system_prompt = """Your only task is to analyze a food description and respond with a valid JSON object containing "calories", "protein", "carbs", and "fat". The values must be numbers. Example: {"calories": 260, "protein": 13.5, "carbs": 28.0, "fat": 11.2}"""
     try:
-        response = client.chat.completions.create(
+        response = ai_client.chat_completion(
+            'nutrition_info',
             model="llama3-8b-8192",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -130,7 +139,7 @@ def get_nutrition_info(food_name: str) -> dict:
         print(f"Error getting nutrition info from AI: {str(e)}")
         return {}
     
-def get_workout_calories(workout_description: str) -> dict:
+def get_workout_calories(workout_description: str, body_weight: float = None) -> dict:
     """
     Uses AI to estimate calories burned from a workout description.
     """
@@ -139,11 +148,13 @@ def get_workout_calories(workout_description: str) -> dict:
     Example for "weight lifting 1 hour": {"calories_burned": 250}
     """
     try:
-        response = client.chat.completions.create(
+        response = ai_client.chat_completion(
+            'workout_calories',
             model="llama3-8b-8192",
             messages=[
                 {"role": "system", "content": system_prompt},
-                {"role": "user", "content": workout_description}
+                {"role": "user", "content": workout_description if not body_weight
+                    else f"{workout_description} (person weighs {body_weight:.0f} kg)"}
             ],
             temperature=0.1,
             max_tokens=100,
@@ -156,28 +167,16 @@ def get_workout_calories(workout_description: str) -> dict:
 
 def get_weekly_summary(user):
     try:
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=7)
-        
-        meals = db.execute_query(
-            """SELECT * FROM meal_logs WHERE user_id = %s AND date >= %s AND date <= %s""",
-            (user.id, start_date, end_date), fetch_all=True
-        ) or []
-        workouts = db.execute_query(
-            """SELECT * FROM workout_logs WHERE user_id = %s AND date >= %s AND date <= %s""",
-            (user.id, start_date, end_date), fetch_all=True
-        ) or []
-        weights = db.execute_query(
-            """SELECT * FROM weight_logs WHERE user_id = %s AND date >= %s AND date <= %s ORDER BY date""",
-            (user.id, start_date, end_date), fetch_all=True
-        ) or []
+        # Rollup totals and first/last weigh-in of the last 7 days, in one query
+        totals = weekly_summary_data(user.id, datetime.utcnow().date())
+        start_weight, end_weight = totals['start_weight'], totals['end_weight']
         
-        total_calories = sum(float(meal.get('calories', 0)) for meal in meals)
-        avg_daily_calories = total_calories / 7 if meals else 0
+        total_calories = totals['calories_in']
+        avg_daily_calories = total_calories / 7 if totals['meal_count'] else 0
         calorie_goal_met = (avg_daily_calories / float(user.daily_calories) * 100) if user.daily_calories else 0
-        total_workout_minutes = sum(float(workout.get('duration', 0)) for workout in workouts)
-        total_calories_burned = sum(float(workout.get('calories_burned', 0)) for workout in workouts)
-        weight_change = float(weights[-1].get('weight', 0)) - float(weights[0].get('weight', 0)) if len(weights) >= 2 else 0
+        total_workout_minutes = totals['workout_minutes']
+        total_calories_burned = totals['calories_burned']
+        weight_change = end_weight - start_weight if start_weight is not None else 0
         
         context = f"""
         Weekly Fitness Summary for {user.name}:
@@ -190,13 +189,14 @@ def get_weekly_summary(user):
         - Total Workout Time: {total_workout_minutes} minutes
         - Total Calories Burned: {total_calories_burned}
         Weight:
-        - Starting Weight: {weights[0].get('weight', 'N/A') if weights else 'N/A'} kg
-        - Ending Weight: {weights[-1].get('weight', 'N/A') if weights else 'N/A'} kg
+        - Starting Weight: {start_weight if start_weight is not None else 'N/A'} kg
+        - Ending Weight: {end_weight if end_weight is not None else 'N/A'} kg
         - Change: {weight_change:.1f} kg
         """
         system_prompt = """You are a fitness coach AI assistant. Analyze the user's weekly summary and provide encouraging feedback and actionable tips for the next week. Keep it concise and positive."""
         
-        response = client.chat.completions.create(
+        response = ai_client.chat_completion(
+            'weekly_summary',
             model="llama3-70b-8192",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -210,17 +210,19 @@ def get_weekly_summary(user):
         print(f"Weekly Summary Error: {str(e)}")
         return "Could not generate weekly summary. Please try again later."
     
+CHAT_SYSTEM_PROMPT = "You are a friendly and knowledgeable fitness assistant named FitBot. Your goal is to help users with their diet, workout, and general health questions. Keep your answers concise and encouraging."
+CHAT_ERROR_REPLY = "Sorry, I'm having trouble connecting right now. Please try again in a moment."
+
 def get_ai_chat_response(message_history: list) -> str:
     """
     Gets a conversational response from the AI, using the chat history.
     """
-    system_prompt = "You are a friendly and knowledgeable fitness assistant named FitBot. Your goal is to help users with their diet, workout, and general health questions. Keep your answers concise and encouraging."
-    
     # The message history is passed directly to the AI
-    messages_to_send = [{"role": "system", "content": system_prompt}] + message_history
+    messages_to_send = [{"role": "system", "content": CHAT_SYSTEM_PROMPT}] + message_history
     
     try:
-        response = client.chat.completions.create(
+        response = ai_client.chat_completion(
+            'chat',
             model="llama3-8b-8192",
             messages=messages_to_send,
             temperature=0.7,
@@ -229,20 +231,107 @@ def get_ai_chat_response(message_history: list) -> str:
         return response.choices[0].message.content
     except Exception as e:
         print(f"AI Chat Error: {str(e)}")
-        return "Sorry, I'm having trouble connecting right now. Please try again in a moment."
+        return CHAT_ERROR_REPLY
+
+def stream_ai_chat_response(message_history: list):
+    """
+    Like get_ai_chat_response, but yields the reply in pieces as the model
+    generates them. If the call fails before any text arrives, the usual
+    error reply is yielded instead.
+    """
+    messages_to_send = [{"role": "system", "content": CHAT_SYSTEM_PROMPT}] + message_history
+    sent_any = False
+    try:
+        stream = ai_client.chat_completion(
+            'chat_stream',
+            model="llama3-8b-8192",
+            messages=messages_to_send,
+            temperature=0.7,
+            max_tokens=500,
+            stream=True
+        )
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                sent_any = True
+                yield delta
+    except Exception as e:
+        print(f"AI Chat Stream Error: {str(e)}")
+        if not sent_any:
+            yield CHAT_ERROR_REPLY
     
+DEFAULT_QUOTE = "The only bad workout is the one that didn't happen."
+
+def _quote_request():
+    system_prompt = "You are a motivational coach. Your only task is to provide one short, powerful, and inspiring fitness or health-related quote. Do not include quotation marks or any other text."
+    return dict(
+        model="llama3-8b-8192",
+        messages=[{"role": "system", "content": system_prompt}],
+        temperature=1.2, # Make it creative
+        max_tokens=100
+    )
+
 def get_daily_quote():
     """Gets a short, motivational fitness quote from the AI."""
     try:
-        system_prompt = "You are a motivational coach. Your only task is to provide one short, powerful, and inspiring fitness or health-related quote. Do not include quotation marks or any other text."
-        response = client.chat.completions.create(
-            model="llama3-8b-8192",
-            messages=[{"role": "system", "content": system_prompt}],
-            temperature=1.2, # Make it creative
-            max_tokens=100
-        )
+        response = ai_client.chat_completion('quote', **_quote_request())
         return response.choices[0].message.content.strip()
     except Exception as e:
         print(f"AI Quote Error: {str(e)}")
         # Provide a fallback quote in case the AI fails
-        return "The only bad workout is the one that didn't happen."
\ No newline at end of file
+        return DEFAULT_QUOTE
+
+
+# --- Async client layer ---
+# Independent LLM calls (the diet and workout plans) are issued
+# concurrently so the caller waits for the slowest one instead of the sum.
+# Request arguments are built up front (they read the DB), then only the
+# network calls run on the event loop, under the same ai_client policy.
+
+AI_CALL_TIMEOUT = ai_client.AI_CALL_TIMEOUT
+
+_ASYNC_CALLS = {
+    'diet': (_diet_request, _parse_plan, ""),
+    'workout': (_workout_request, _parse_plan, ""),
+}
+
+
+async def _call_with_timeout(client, name, request_kwargs, parse, fallback, timeout):
+    try:
+        response = await ai_client.chat_completion_async(name, client, timeout, **request_kwargs)
+        return parse(response)
+    except asyncio.TimeoutError:
+        print(f"AI {name} call timed out after {timeout}s")
+        return fallback
+    except Exception as e:
+        print(f"AI {name} call error: {str(e)}")
+        return fallback
+
+
+async def generate_ai_content_async(user, kinds, timeout=None):
+    """
+    Runs the requested calls ('diet', 'workout') concurrently, each with
+    its own deadline. Timed-out calls are cancelled and return their fallback.
+    """
+    timeout = timeout or AI_CALL_TIMEOUT
+    requests = {}
+    for kind in kinds:
+        build, parse, fallback = _ASYNC_CALLS[kind]
+        try:
+            requests[kind] = (build(user), parse, fallback)
+        except Exception as e:
+            print(f"AI {kind} request error: {str(e)}")
+    async with ai_client.get_async_client() as client:
+        results = await asyncio.gather(*(
+            _call_with_timeout(client, kind, kwargs, parse, fallback, timeout)
+            for kind, (kwargs, parse, fallback) in requests.items()
+        ))
+    content = {kind: _ASYNC_CALLS[kind][2] for kind in kinds}
+    content.update(zip(requests.keys(), results))
+    return content
+
+
+@profiling.timed('ai')
+def generate_ai_content(user, kinds=('diet', 'workout'), timeout=None):
+    """Sync wrapper around generate_ai_content_async for use from request/worker threads."""
+    return asyncio.run(generate_ai_content_async(user, kinds, timeout))
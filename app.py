@@ -1,27 +1,66 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file, session
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file, session, abort, Response, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user, UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
-from database import db
-from graph_utils import create_plot
-from ai_integration import get_ai_diet_suggestion, get_ai_workout_plan, get_nutrition_info,get_daily_quote, get_workout_calories, get_ai_chat_response
-from export_utils import generate_pdf_report, generate_excel_report
+from database import db, day_range, StreamLimitError
+import chart_service
+from ai_integration import get_ai_diet_suggestion, get_ai_workout_plan, get_ai_chat_response, stream_ai_chat_response, get_weekly_summary
+from export_utils import generate_pdf_report, generate_excel_report, BULK_FORMATS
+from reporting import fetch_report_rows, stream_report_rows, iter_log_rows, EXPORT_TABLES
+from rollups import insert_meal, insert_workout, insert_weight, insert_logs_batch, delete_meal, get_daily_series, get_daily_stats, rebuild_daily_stats
+from streaks import get_streak, verify_streaks
+from sync_log import next_sync_seq
 from datetime import datetime, timedelta
+from functools import wraps
+import hmac
+import io
 import os
 import json
+import click
 from config import Config
+from cache import TTLCache
+import ai_client
+import chat_store
+import dashboard_cache
+import export_jobs
+import log_import
+import sync
+import plans
+import profiling
+import query_debug
+import plan_scheduler
+import lookup_cache
 
 
 app = Flask(__name__)
 app.config.from_pyfile('config.py')
 app.config.from_object(Config)
 Config.init_app(app)
+ai_client.configure(timeout=app.config['AI_CALL_TIMEOUT'], max_retries=app.config['AI_MAX_RETRIES'],
+                    rate_per_minute=app.config['AI_RATE_PER_MINUTE'],
+                    breaker_threshold=app.config['AI_BREAKER_THRESHOLD'], breaker_reset=app.config['AI_BREAKER_RESET'])
+chat_store.configure(app.config['CHAT_STORE'])
+dashboard_cache.configure(size=app.config['DASHBOARD_CACHE_SIZE'], ttl=app.config['DASHBOARD_CACHE_TTL'])
+export_jobs.configure(directory=app.config['EXPORT_DIR'], workers=app.config['EXPORT_WORKERS'], ttl=app.config['EXPORT_TTL'])
+plans.configure(workers=app.config['PLAN_WORKERS'])
+if app.config['PROFILING_ENABLED']:
+    profiling.init_app(app, server_timing=app.config['SERVER_TIMING_HEADER'],
+                       slow_ms=app.config['SLOW_REQUEST_MS'], slow_sample=app.config['SLOW_REQUEST_SAMPLE'])
+    db.add_query_listener(profiling.record_query)
+# Always installed: it only records when DB_DEBUG_QUERIES is set or the app runs in debug mode
+query_debug.init_app(app, budgets=query_debug.parse_budgets(app.config['QUERY_BUDGETS']),
+                     strict=app.config['QUERY_BUDGET_STRICT'], enabled=app.config['DB_DEBUG_QUERIES'])
+if app.config['PLAN_SCHEDULER_ENABLED']:
+    plan_scheduler.start_scheduler(app.config['PLAN_PREGEN_HOUR'])
 
 
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+# Keyed by user id; holds plain row dicts so each request gets its own User object
+user_cache = TTLCache(maxsize=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL'])
+
 
 # --- FIX: STEP 2 of 2: This context processor makes `now` available in all templates ---
 @app.context_processor
@@ -35,6 +74,14 @@ def inject_now():
 # No other changes are needed.
 # ===============================================================
 
+# Columns User.save() writes; only the ones changed since the row was loaded are updated
+PROFILE_COLUMNS = (
+    'email', 'name', 'password', 'profile_photo', 'age', 'gender', 'height', 'weight',
+    'goal_weight', 'diet_preference', 'fitness_goal', 'activity_level', 'daily_calories',
+    'dark_mode', 'medical_conditions', 'past_surgeries',
+)
+
+
 class User(UserMixin):
     def __init__(self, user_dict):
         self.id = user_dict.get('id')
@@ -55,15 +102,33 @@ class User(UserMixin):
         self.created_at = user_dict.get('created_at')
         self.medical_conditions = user_dict.get('medical_conditions')
         self.past_surgeries = user_dict.get('past_surgeries')
+        self._loaded = {column: getattr(self, column) for column in PROFILE_COLUMNS} if self.id else {}
 
     def get_id(self):
         return str(self.id)
 
+    def to_dict(self):
+        return {
+            'id': self.id, 'email': self.email, 'name': self.name, 'password': self.password,
+            'profile_photo': self.profile_photo, 'age': self.age, 'gender': self.gender,
+            'height': self.height, 'weight': self.weight, 'goal_weight': self.goal_weight,
+            'diet_preference': self.diet_preference, 'fitness_goal': self.fitness_goal,
+            'activity_level': self.activity_level, 'daily_calories': self.daily_calories,
+            'dark_mode': self.dark_mode, 'created_at': self.created_at,
+            'medical_conditions': self.medical_conditions, 'past_surgeries': self.past_surgeries,
+        }
+
     @staticmethod
     def get(user_id):
-        query = "SELECT * FROM users WHERE id = %s"
-        user_data = db.execute_query(query, (user_id,), fetch_one=True)
-        return User(user_data) if user_data else None
+        user_id = int(user_id)
+        user_data = user_cache.get(user_id)
+        if user_data is None:
+            query = "SELECT * FROM users WHERE id = %s"
+            user_data = db.execute_query(query, (user_id,), fetch_one=True)
+            if not user_data:
+                return None
+            user_cache.set(user_id, user_data)
+        return User(dict(user_data))
 
     @staticmethod
     def get_by_email(email):
@@ -74,24 +139,27 @@ class User(UserMixin):
     def save(self):
         # This method is now fully corrected to handle both updates and new user creation.
         if self.id:
-            # This query is for updating an existing user's profile
-            query = """
-                UPDATE users SET
-                    email = %s, name = %s, password = %s, profile_photo = %s,
-                    age = %s, gender = %s, height = %s, weight = %s,
-                    goal_weight = %s, diet_preference = %s, fitness_goal = %s,
-                    activity_level = %s, daily_calories = %s, dark_mode = %s,
-                    medical_conditions = %s, past_surgeries = %s
-                WHERE id = %s
-            """
-            params = (
-                self.email, self.name, self.password, self.profile_photo,
-                self.age, self.gender, self.height, self.weight,
-                self.goal_weight, self.diet_preference, self.fitness_goal,
-                self.activity_level, self.daily_calories, self.dark_mode,
-                self.medical_conditions, self.past_surgeries, self.id
-            )
-            db.execute_query(query, params, commit=True)
+            # Only the columns this request changed: the object may come from another
+            # worker's out-of-date cache, and rewriting every column would undo
+            # whatever was saved since it was loaded
+            changed = [column for column in PROFILE_COLUMNS if getattr(self, column) != self._loaded.get(column)]
+            if not changed:
+                return
+            query = f"UPDATE users SET {', '.join(f'{column} = %s' for column in changed)} WHERE id = %s"
+            params = tuple(getattr(self, column) for column in changed) + (self.id,)
+            try:
+                with db.get_cursor(commit=True) as cursor:
+                    cursor.execute(query, params)
+                    # Moves the profile data version, so cached dashboard sections recompute
+                    next_sync_seq(cursor, self.id, kinds=('profile',))
+                    cursor.execute("SELECT * FROM users WHERE id = %s", (self.id,))
+                    saved = cursor.fetchone()
+            except Exception:
+                user_cache.delete(self.id)
+                raise
+            # Cache the row as stored, including columns other workers changed
+            self._loaded = {column: saved[column] for column in PROFILE_COLUMNS}
+            user_cache.set(self.id, saved)
         else:
             # This query is for creating a brand new user
             query = """
@@ -107,9 +175,13 @@ class User(UserMixin):
                 self.fitness_goal, self.activity_level, self.daily_calories, self.dark_mode,
                 self.medical_conditions, self.past_surgeries
             )
-            db.execute_query(query, params, commit=True)
-            # Get the new ID for the user object
-            self.id = db.execute_query("SELECT LAST_INSERT_ID()", fetch_one=True)['LAST_INSERT_ID()']
+            # LAST_INSERT_ID() is per-connection, so read it from the same pooled cursor
+            with db.get_cursor(commit=True) as cursor:
+                cursor.execute(query, params)
+                self.id = cursor.lastrowid
+            self._loaded = {column: getattr(self, column) for column in PROFILE_COLUMNS}
+            # Write-through so the next request sees the saved values without a SELECT
+            user_cache.set(self.id, self.to_dict())
             
 @login_manager.user_loader
 def load_user(user_id):
@@ -134,6 +206,45 @@ def calculate_daily_calories(user):
     else: return tdee
 
 
+def metrics_token_required(view):
+    """
+    Process-wide operational data (pools, caches, AI usage, route timings) is
+    not for users: these endpoints are off unless METRICS_TOKEN is set, and
+    then require it as a bearer token.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = app.config['METRICS_TOKEN']
+        if not token:
+            abort(404)
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+            abort(401)
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@app.route('/api/cache-stats')
+@metrics_token_required
+def cache_stats():
+    return jsonify({'success': True, 'user_cache': user_cache.stats(), 'db_pool': db.pool_stats(),
+                    'charts': chart_service.stats(), 'lookups': lookup_cache.stats(),
+                    'dashboard': dashboard_cache.stats()})
+
+
+@app.route('/api/ai-stats')
+@metrics_token_required
+def ai_stats():
+    """Per-function latency, token usage and error rates for Groq calls, plus the breaker state."""
+    return jsonify({'success': True, **ai_client.stats()})
+
+
+@app.route('/metrics')
+@metrics_token_required
+def metrics():
+    """Per-route request timings (db/ai/chart/template/app) in the Prometheus text format."""
+    return Response(profiling.render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/toggle-dark-mode', methods=['POST'])
 @login_required
 def toggle_dark_mode():
@@ -248,52 +359,50 @@ def dashboard():
             return redirect(url_for('profile'))
 
         # --- NEW: Daily Motivational Quote Logic ---
+        # Fetched in the background; the default quote shows until it is in
         today_str = today.isoformat()
         if session.get('quote_date') != today_str:
-            session['daily_quote'] = get_daily_quote()
-            session['quote_date'] = today_str
+            session['daily_quote'], ready = plans.get_daily_quote_or_default(today)
+            if ready:
+                session['quote_date'] = today_str
         
         daily_quote = session.get('daily_quote')
 
         # --- Data Fetching ---
-        thirty_days_ago = today - timedelta(days=29)
-        seven_days_ago = today - timedelta(days=6)
-
-        user_meals_today = db.execute_query("SELECT * FROM meal_logs WHERE user_id = %s AND DATE(date) = %s", (current_user.id, today), fetch_all=True) or []
-        user_workouts_today = db.execute_query("SELECT * FROM workout_logs WHERE user_id = %s AND DATE(date) = %s", (current_user.id, today), fetch_all=True) or []
-        
-        weight_data = db.execute_query("SELECT date, weight FROM weight_logs WHERE user_id = %s AND DATE(date) >= %s ORDER BY date", (current_user.id, thirty_days_ago), fetch_all=True) or []
-        calorie_trend_data = db.execute_query(
-            """SELECT DATE(date) as log_date, SUM(calories) as total_calories 
-               FROM meal_logs WHERE user_id = %s AND DATE(date) >= %s 
-               GROUP BY DATE(date) ORDER BY log_date""",
-            (current_user.id, seven_days_ago),
-            fetch_all=True
-        ) or []
-
-        # --- Metric Calculations ---
-        total_calories = sum(float(meal.get('calories', 0)) for meal in user_meals_today)
-        workout_calories = sum(float(workout.get('calories_burned', 0)) for workout in user_workouts_today)
-        streak = calculate_streak(current_user.id)
+        # Each section comes from the per-user cache unless the data it shows
+        # changed since it was built (see dashboard_cache.py)
+        user_id = current_user.id
+        versions = dashboard_cache.data_versions(user_id)
+        user_meals_today, user_workouts_today, total_calories, workout_calories = dashboard_cache.get_section(
+            user_id, 'today', versions, today, lambda: dashboard_today(user_id, today))
+        streak = dashboard_cache.get_section(user_id, 'streak', versions, today, lambda: calculate_streak(user_id))
         
-        # --- Generate Graphs as Base64 Images ---
+        # --- Graphs: rendered off-thread and served from /charts with an ETag ---
+        # With CLIENT_SIDE_CHARTS the browser draws them from /api/chart-data instead.
         weight_graph_img = None
-        if weight_data and len(weight_data) > 1:
-            weight_dates = [entry['date'].strftime('%b %d') for entry in weight_data]
-            weights = [float(entry['weight']) for entry in weight_data]
-            weight_graph_img = create_plot(weight_dates, weights, "Weight Progress (30 Days)", "Weight (kg)", "#4f46e5")
-
         calorie_graph_img = None
-        date_map = { (seven_days_ago + timedelta(days=i)).strftime('%b %d'): 0 for i in range(7) }
-        for row in calorie_trend_data:
-            date_map[row['log_date'].strftime('%b %d')] = float(row['total_calories'])
-        
-        if any(v > 0 for v in date_map.values()):
-             calorie_graph_img = create_plot(list(date_map.keys()), list(date_map.values()), "Calorie Trend (7 Days)", "Calories (kcal)", "#10b981")
-
-        # --- AI Plan Generation ---
-        diet_plan_html = get_or_create_plan_html(current_user, today, 'diet')
-        workout_plan_html = get_or_create_plan_html(current_user, today, 'workout')
+        if not app.config['CLIENT_SIDE_CHARTS']:
+            weight_key = dashboard_cache.get_section(
+                user_id, 'weight_chart', versions, today,
+                lambda: chart_service.prepare_chart('weight-30d', user_id, today))
+            if weight_key:
+                weight_graph_img = url_for('chart_image', name='weight-30d', v=weight_key)
+
+            calorie_key = dashboard_cache.get_section(
+                user_id, 'calorie_chart', versions, today,
+                lambda: chart_service.prepare_chart('calories-7d', user_id, today))
+            if calorie_key:
+                calorie_graph_img = url_for('chart_image', name='calories-7d', v=calorie_key)
+
+        # --- AI Plans: normally pre-generated overnight; if missing, render a
+        # placeholder now and let the page poll /api/plan while it is generated.
+        # Only cached once both plans are ready. ---
+        user = current_user._get_current_object()
+        plan_results = dashboard_cache.get_section(
+            user_id, 'plans', versions, today, lambda: plans.get_plans_or_placeholders(user, today),
+            cache_if=lambda results: all(ready for _, ready in results.values()))
+        diet_plan_html, diet_ready = plan_results['diet']
+        workout_plan_html, workout_ready = plan_results['workout']
 
         return render_template('dashboard.html',
             total_calories=total_calories,
@@ -306,7 +415,9 @@ def dashboard():
             workout_plan_html=workout_plan_html,
             user_meals_today=user_meals_today,
             user_workouts_today=user_workouts_today,
-            daily_quote=daily_quote  # --- MODIFIED: Pass the new quote to the template ---
+            daily_quote=daily_quote,  # --- MODIFIED: Pass the new quote to the template ---
+            client_side_charts=app.config['CLIENT_SIDE_CHARTS'],
+            plans_pending=not (diet_ready and workout_ready)
         )
     except Exception as e:
         print(f"--- CRITICAL DASHBOARD ERROR ---")
@@ -316,49 +427,48 @@ def dashboard():
         flash(f"A critical error occurred while loading the dashboard. Please check your profile information.", "error")
         return redirect(url_for('profile'))
     
-# --- NEW: Helper function to get/create AI plans ---
-def get_or_create_plan_html(user, date, plan_type):
-    """
-    Checks for a cached daily plan in the database. 
-    If not found, it generates a new one using the AI and saves it.
-    """
-    # --- FIX IS HERE: Use user.id instead of passing the whole user object ---
-    query = "SELECT html_content FROM daily_plans WHERE user_id = %s AND date = %s AND plan_type = %s"
-    existing_plan = db.execute_query(query, (user.id, date, plan_type), fetch_one=True)
-
-    if existing_plan and existing_plan['html_content']:
-        return existing_plan['html_content']
-
-    # If not, generate a new plan using the AI
-    html_content = ""
-    try:
-        if plan_type == 'diet':
-            ai_response_str = get_ai_diet_suggestion(user) or ""
-            for item in ai_response_str.split(';'):
-                if ':' in item and len(item.split(':')) == 3:
-                    meal_type, food, cals = item.split(':')
-                    html_content += f"""<li class="plan-item" data-name="{food}" data-calories="{float(cals)}" data-type="meal"><input type="checkbox"><div class="item-details"><div class="item-name">{meal_type}: {food}</div><div class="item-info">{float(cals):.0f} kcal</div></div><div class="item-actions"><button class="edit-btn"><i class="fas fa-pencil-alt"></i></button></div></li>"""
-        
-        elif plan_type == 'workout':
-            ai_response_str = get_ai_workout_plan(user) or ""
-            for item in ai_response_str.split(';'):
-                if ':' in item and len(item.split(':')) == 3:
-                    cat, ex, cals = item.split(':')
-                    html_content += f"""<li class="plan-item" data-name="{ex}" data-calories="{float(cals)}" data-type="workout"><input type="checkbox"><div class="item-details"><div class="item-name">{cat}: {ex}</div><div class="item-info">{float(cals):.0f} kcal burned</div></div><div class="item-actions"><button class="edit-btn"><i class="fas fa-pencil-alt"></i></button></div></li>"""
-        
-        if html_content:
-            save_query = """
-                INSERT INTO daily_plans (user_id, date, plan_type, html_content) 
-                VALUES (%s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE html_content = VALUES(html_content)
-            """
-            db.execute_query(save_query, (user.id, date, plan_type, html_content), commit=True)
-
-    except Exception as e:
-        print(f"CRITICAL ERROR generating AI {plan_type} plan: {e}")
-        return ""
-
-    return html_content
+@app.route('/charts/<name>.png')
+@login_required
+def chart_image(name):
+    if name not in chart_service.CHARTS:
+        abort(404)
+    key, spec = chart_service.build_chart(name, current_user.id)
+    if key is None:
+        abort(404)
+    # The key is a hash of the chart's data and style, so it doubles as the ETag
+    if key in request.if_none_match:
+        return Response(status=304, headers={'ETag': f'"{key}"'})
+    response = Response(chart_service.render_chart(key, spec), mimetype='image/png')
+    response.set_etag(key)
+    response.cache_control.private = True
+    response.cache_control.max_age = 86400 if request.args.get('v') == key else 0
+    return response
+
+
+@app.route('/api/chart-data/<series>')
+@login_required
+def chart_data(series):
+    if series not in chart_service.CHART_DATA:
+        return jsonify({'success': False, 'error': 'Unknown series'}), 404
+    days = request.args.get('days', 30, type=int)
+    if days not in chart_service.CHART_DATA_RANGES:
+        return jsonify({'success': False, 'error': f'days must be one of {list(chart_service.CHART_DATA_RANGES)}'}), 400
+    data = chart_service.chart_data(series, current_user.id, days)
+    response = jsonify({'success': True, **data})
+    response.add_etag()
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@app.route('/api/plan/<plan_type>')
+@login_required
+def plan_status(plan_type):
+    """Polled by the dashboard while a plan is still being generated in the background."""
+    if plan_type not in plans.PLAN_TYPES:
+        return jsonify({'success': False, 'error': 'Invalid plan type'}), 400
+    html_content, ready = plans.get_plans_or_placeholders(current_user._get_current_object(), datetime.utcnow().date(), (plan_type,))[plan_type]
+    return jsonify({'success': True, 'ready': ready, 'html': html_content if ready else ''})
 
 # --- NEW: API endpoint for smart food logging ---
 @app.route('/api/get-food-details', methods=['POST'])
@@ -371,7 +481,7 @@ def get_food_details():
     try:
         # This calls your AI function to get nutrition data
         # Example return: {"calories": 95, "protein": 1.3, "carbs": 25, "fat": 0.3}
-        nutrition_data = get_nutrition_info(food_query) 
+        nutrition_data = lookup_cache.cached_nutrition_info(food_query)
         
         if not nutrition_data:
             return jsonify({'success': False, 'error': 'Could not find nutrition data for this food.'}), 404
@@ -381,19 +491,21 @@ def get_food_details():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def dashboard_today(user_id, today):
+    """Today's meals and workouts with their calorie totals, for the dashboard."""
+    # Half-open [start, end) ranges keep these filters sargable on (user_id, date)
+    today_start, today_end = day_range(today)
+    meals = db.execute_query("SELECT * FROM meal_logs WHERE user_id = %s AND date >= %s AND date < %s", (user_id, today_start, today_end), fetch_all=True) or []
+    workouts = db.execute_query("SELECT * FROM workout_logs WHERE user_id = %s AND date >= %s AND date < %s", (user_id, today_start, today_end), fetch_all=True) or []
+    total_calories = sum(float(meal.get('calories', 0)) for meal in meals)
+    workout_calories = sum(float(workout.get('calories_burned', 0)) for workout in workouts)
+    return meals, workouts, total_calories, workout_calories
+
+
 def calculate_streak(user_id):
-    query = """
-        WITH DateSeries AS (
-            SELECT DISTINCT DATE(date) as log_date FROM meal_logs WHERE user_id = %s
-        ),
-        DateGroups AS (
-            SELECT log_date, DATE_SUB(log_date, INTERVAL DENSE_RANK() OVER (ORDER BY log_date) DAY) as grp
-            FROM DateSeries
-        )
-        SELECT COUNT(*) as streak_length FROM DateGroups WHERE grp = (SELECT grp FROM DateGroups ORDER BY log_date DESC LIMIT 1)
-    """
-    result = db.execute_query(query, (user_id,), fetch_one=True)
-    return result['streak_length'] if result and result['streak_length'] is not None else 0
+    # Reads the incrementally maintained streak instead of scanning every logged day
+    state = get_streak(user_id)
+    return state['current_streak'] if state else 0
     
 
 @app.route('/log_item_from_dashboard', methods=['POST'])
@@ -403,11 +515,9 @@ def log_item_from_dashboard():
         data = request.get_json()
         item_type = data.get('type')
         if item_type == 'meal':
-            db.execute_query("INSERT INTO meal_logs (user_id, name, calories, date) VALUES (%s, %s, %s, %s)",
-                             (current_user.id, data.get('name'), int(data.get('calories',0)), datetime.utcnow()), commit=True)
+            insert_meal(current_user.id, data.get('name'), int(data.get('calories',0)), date=datetime.utcnow())
         elif item_type == 'workout':
-            db.execute_query("INSERT INTO workout_logs (user_id, type, calories_burned, date) VALUES (%s, %s, %s, %s)",
-                             (current_user.id, data.get('name'), int(data.get('calories',0)), datetime.utcnow()), commit=True)
+            insert_workout(current_user.id, data.get('name'), calories_burned=int(data.get('calories',0)), date=datetime.utcnow())
         else:
             return jsonify({'success': False, 'error': 'Invalid item type'}), 400
         return jsonify({'success': True})
@@ -415,6 +525,94 @@ def log_item_from_dashboard():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/log/batch', methods=['POST'])
+@login_required
+def log_batch():
+    """
+    Logs several meals/workouts in one transaction:
+    {"items": [{"type": "meal", "name": ..., "calories": ..., "protein": ...}, {"type": "workout", ...}]}
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        meals, workouts = log_import.parse_batch(data.get('items'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    try:
+        meal_count, workout_count = insert_logs_batch(current_user.id, meals, workouts)
+        return jsonify({'success': True, 'meals': meal_count, 'workouts': workout_count})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/meals/<int:meal_id>', methods=['DELETE'])
+@login_required
+def delete_meal_log(meal_id):
+    """Deletes one of the user's meal logs; the rollup, streak and sync clients follow."""
+    try:
+        if not delete_meal(current_user.id, meal_id):
+            return jsonify({'success': False, 'error': 'Meal not found'}), 404
+        return jsonify({'success': True})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/sync', methods=['POST'])
+@login_required
+def api_sync():
+    """
+    Offline sync for mobile clients, in one round trip:
+    {"cursor": "<from the last sync, or null>",
+     "entries": [{"idempotency_key": "...", "type": "meal|workout|weight", "date": "...", ...}]}
+    Entries are applied in one transaction (replays are reported as duplicates),
+    then every server-side change after the cursor is returned with a new cursor.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        cursor_value = sync.parse_cursor(data.get('cursor'))
+        entries = sync.parse_entries(data.get('entries') or [])
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    query_debug.allow_queries(sync.SYNC_QUERIES_PER_ENTRY * len(entries))
+    try:
+        applied = sync.apply_entries(current_user.id, entries)
+        # Like /log/weight: a newly synced weigh-in becomes the profile weight if it is the latest
+        weights = [fields for (key, entry_type, fields), result in zip(entries, applied)
+                   if entry_type == 'weight' and result['status'] == 'created']
+        if weights:
+            latest = max(weights, key=lambda fields: fields['date'])
+            latest_logged = db.execute_query(
+                "SELECT MAX(date) AS date FROM weight_logs WHERE user_id = %s", (current_user.id,), fetch_one=True
+            )
+            if latest_logged['date'] is None or latest['date'] >= latest_logged['date']:
+                current_user.weight = latest['weight']
+                current_user.daily_calories = calculate_daily_calories(current_user)
+                current_user.save()
+        changes, next_cursor, has_more = sync.get_changes(current_user.id, cursor_value)
+        return jsonify({'success': True, 'applied': applied, 'changes': changes,
+                        'cursor': next_cursor, 'has_more': has_more})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/import/<kind>', methods=['POST'])
+@login_required
+def import_logs(kind):
+    """Imports historical meals or workouts from an uploaded CSV (same columns as the CSV export)."""
+    if kind not in ('meals', 'workouts'):
+        abort(404)
+    upload = request.files.get('file')
+    if not upload:
+        return jsonify({'success': False, 'error': 'A CSV file is required'}), 400
+    try:
+        text_stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+        imported = log_import.import_csv(current_user.id, kind, text_stream)
+        return jsonify({'success': True, 'imported': imported})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @app.route('/log/meal', methods=['GET', 'POST'])
 @login_required
 def log_meal():
@@ -426,8 +624,7 @@ def log_meal():
             carbs = float(request.form.get('carbs', 0))
             fat = float(request.form.get('fat', 0))
             
-            params = (current_user.id, request.form.get('name'), calories, protein, carbs, fat, request.form.get('notes'))
-            db.execute_query("INSERT INTO meal_logs (user_id, name, calories, protein, carbs, fat, notes) VALUES (%s, %s, %s, %s, %s, %s, %s)", params, commit=True)
+            insert_meal(current_user.id, request.form.get('name'), calories, protein, carbs, fat, request.form.get('notes'), date=datetime.utcnow())
             
             flash('Meal logged successfully!', 'success')
             return redirect(url_for('dashboard'))
@@ -443,8 +640,8 @@ def api_get_workout_calories():
         if not description:
             return jsonify({'success': False, 'error': 'Description is required'}), 400
         
-        # Call the new AI function
-        calorie_data = get_workout_calories(description)
+        # Cached per description and body-weight bucket, with a MET-table fallback
+        calorie_data = lookup_cache.cached_workout_calories(description, current_user.weight)
         if not calorie_data:
             return jsonify({'success': False, 'error': 'Could not calculate calories'}), 500
             
@@ -458,17 +655,13 @@ def api_get_workout_calories():
 def log_workout():
     if request.method == 'POST':
         try:
-            db.execute_query(
-                "INSERT INTO workout_logs (user_id, type, duration, calories_burned, notes, date) VALUES (%s, %s, %s, %s, %s, %s)",
-                (
-                    current_user.id,
-                    request.form.get('type'),
-                    int(request.form.get('duration', 0)),
-                    float(request.form.get('calories_burned', 0)),
-                    request.form.get('notes'),
-                    datetime.utcnow()
-                ),
-                commit=True
+            insert_workout(
+                current_user.id,
+                request.form.get('type'),
+                int(request.form.get('duration', 0)),
+                float(request.form.get('calories_burned', 0)),
+                request.form.get('notes'),
+                date=datetime.utcnow()
             )
             flash('Workout logged successfully!', 'success')
             return redirect(url_for('dashboard'))
@@ -490,7 +683,7 @@ def log_weight():
     if request.method == 'POST':
         try:
             weight_today = float(request.form.get('weight', 0))
-            db.execute_query("INSERT INTO weight_logs (user_id, weight, notes) VALUES (%s, %s, %s)", (current_user.id, weight_today, request.form.get('notes')), commit=True)
+            insert_weight(current_user.id, weight_today, request.form.get('notes'))
             current_user.weight = weight_today
             current_user.daily_calories = calculate_daily_calories(current_user)
             current_user.save()
@@ -534,16 +727,42 @@ def weekly_summary():
         return jsonify({'success': False, 'error': str(e)})
 
 
+# Longest range a single export may cover
+EXPORT_MAX_DAYS = 10 * 366
+
+
+def get_export_range(default_days):
+    """
+    Reads the export date range from the query string or form: start=YYYY-MM-DD&end=YYYY-MM-DD,
+    or days=N ending today. Returns inclusive (start_day, end_day); raises ValueError.
+    """
+    today = datetime.utcnow().date()
+    values = request.values
+    try:
+        end_day = datetime.strptime(values['end'], '%Y-%m-%d').date() if values.get('end') else today
+        if values.get('start'):
+            start_day = datetime.strptime(values['start'], '%Y-%m-%d').date()
+        else:
+            start_day = end_day - timedelta(days=int(values.get('days', default_days)))
+    except ValueError:
+        raise ValueError("Dates must be in YYYY-MM-DD format and days a whole number")
+    if start_day > end_day:
+        raise ValueError("The start date must not be after the end date")
+    if (end_day - start_day).days > EXPORT_MAX_DAYS:
+        raise ValueError(f"Exports can cover at most {EXPORT_MAX_DAYS} days")
+    return start_day, end_day
+
+
 @app.route('/export/pdf')
 @login_required
 def export_pdf():
     try:
-        end_date, start_date = datetime.utcnow(), datetime.utcnow() - timedelta(days=7)
-        meals = db.execute_query("SELECT * FROM meal_logs WHERE user_id = %s AND date BETWEEN %s AND %s", (current_user.id, start_date, end_date), fetch_all=True)
-        workouts = db.execute_query("SELECT * FROM workout_logs WHERE user_id = %s AND date BETWEEN %s AND %s", (current_user.id, start_date, end_date), fetch_all=True)
-        weights = db.execute_query("SELECT * FROM weight_logs WHERE user_id = %s AND date BETWEEN %s AND %s", (current_user.id, start_date, end_date), fetch_all=True)
-        pdf_data = generate_pdf_report(current_user, meals, workouts, weights)
-        return send_file(pdf_data, as_attachment=True, download_name=f"fitness_report_{end_date.strftime('%Y%m%d')}.pdf", mimetype='application/pdf')
+        start_day, end_day = get_export_range(default_days=7)
+        rows = fetch_report_rows(current_user.id, start_day, end_day)
+        meals, workouts, weights = rows['meals'], rows['workouts'], rows['weights']
+        daily_stats = get_daily_stats(current_user.id, start_day, end_day)
+        pdf_data = generate_pdf_report(current_user, meals, workouts, weights, daily_stats)
+        return send_file(pdf_data, as_attachment=True, download_name=f"fitness_report_{end_day.strftime('%Y%m%d')}.pdf", mimetype='application/pdf')
     except Exception as e:
         flash(f'Error generating PDF: {str(e)}', 'error')
         return redirect(url_for('dashboard'))
@@ -553,28 +772,104 @@ def export_pdf():
 @login_required
 def export_excel():
     try:
-        end_date, start_date = datetime.utcnow(), datetime.utcnow() - timedelta(days=30)
-        meals = db.execute_query("SELECT * FROM meal_logs WHERE user_id = %s AND date BETWEEN %s AND %s", (current_user.id, start_date, end_date), fetch_all=True)
-        workouts = db.execute_query("SELECT * FROM workout_logs WHERE user_id = %s AND date BETWEEN %s AND %s", (current_user.id, start_date, end_date), fetch_all=True)
-        weights = db.execute_query("SELECT * FROM weight_logs WHERE user_id = %s AND date BETWEEN %s AND %s", (current_user.id, start_date, end_date), fetch_all=True)
-        excel_data = generate_excel_report(current_user, meals, workouts, weights)
-        return send_file(excel_data, as_attachment=True, download_name=f"fitness_data_{end_date.strftime('%Y%m%d')}.xlsx", mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        start_day, end_day = get_export_range(default_days=30)
+        # Log rows are streamed from one query straight into the write-only workbook
+        meals, workouts, weights = stream_report_rows(current_user.id, start_day, end_day)
+        daily_stats = get_daily_stats(current_user.id, start_day, end_day)
+        excel_data = generate_excel_report(current_user, meals, workouts, weights, daily_stats)
+        return send_file(excel_data, as_attachment=True, download_name=f"fitness_data_{start_day.strftime('%Y%m%d')}_{end_day.strftime('%Y%m%d')}.xlsx", mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    except StreamLimitError:
+        flash('Too many exports are running right now. Try again in a minute, or queue a background export.', 'warning')
+        return redirect(url_for('dashboard'))
     except Exception as e:
         flash(f'Error generating Excel file: {str(e)}', 'error')
         return redirect(url_for('dashboard'))
 
 
+@app.route('/export/data/<kind>.<fmt>')
+@login_required
+def export_bulk_data(kind, fmt):
+    """
+    Streams one log (meals, workouts or weights) for a date range as CSV or
+    NDJSON. Rows go from an unbuffered cursor straight to the response, so the
+    first bytes leave immediately and memory stays flat for any range.
+    """
+    if kind not in EXPORT_TABLES or fmt not in BULK_FORMATS:
+        abort(404)
+    try:
+        start_day, end_day = get_export_range(default_days=30)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    formatter, mimetype = BULK_FORMATS[fmt]
+    try:
+        rows = iter_log_rows(kind, current_user.id, start_day, end_day)
+    except StreamLimitError:
+        return jsonify({'success': False, 'error': 'Too many exports are running right now, try again shortly'}), 429, \
+            {'Retry-After': '30'}
+    filename = f"{kind}_{start_day.strftime('%Y%m%d')}_{end_day.strftime('%Y%m%d')}.{fmt}"
+    return Response(formatter(kind, rows), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"',
+                             'X-Accel-Buffering': 'no'})
+
+
+@app.route('/export/jobs', methods=['POST'])
+@login_required
+def create_export_job():
+    """Queues a PDF/Excel export in the background; poll the status URL, then download."""
+    job_type = request.values.get('type', 'excel')
+    if job_type not in export_jobs.JOB_TYPES:
+        return jsonify({'success': False, 'error': 'type must be pdf or excel'}), 400
+    try:
+        start_day, end_day = get_export_range(default_days=7 if job_type == 'pdf' else 30)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    try:
+        job = export_jobs.enqueue(current_user, job_type, start_day, end_day)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    return jsonify({'success': True, **_export_job_payload(job)}), 202
+
+
+def _export_job_payload(job):
+    payload = {key: job[key] for key in ('id', 'type', 'start', 'end', 'status', 'error')}
+    payload['status_url'] = url_for('export_job_status', job_id=job['id'])
+    if job['status'] == 'done':
+        payload['download_url'] = url_for('download_export_job', job_id=job['id'])
+    return payload
+
+
+def _get_own_export_job(job_id):
+    job = export_jobs.get_job(job_id)
+    if not job or job['user_id'] != current_user.id:
+        abort(404)
+    return job
+
+
+@app.route('/export/jobs/<job_id>')
+@login_required
+def export_job_status(job_id):
+    return jsonify({'success': True, **_export_job_payload(_get_own_export_job(job_id))})
+
+
+@app.route('/export/jobs/<job_id>/download')
+@login_required
+def download_export_job(job_id):
+    _get_own_export_job(job_id)
+    artifact = export_jobs.get_artifact(job_id)
+    if artifact is None:
+        return jsonify({'success': False, 'error': 'Export is not ready yet'}), 409
+    path, download_name, mimetype = artifact
+    return send_file(path, as_attachment=True, download_name=download_name, mimetype=mimetype)
+
+
 @app.route('/api/calories-trend')
 @login_required
 def calories_trend():
     try:
         end_date, start_date = datetime.utcnow().date(), datetime.utcnow().date() - timedelta(days=6)
-        dates = [(start_date + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(7)]
-        calories_data = {date: 0 for date in dates}
-        results = db.execute_query("SELECT DATE(date) as log_date, SUM(calories) as total_calories FROM meal_logs WHERE user_id = %s AND DATE(date) BETWEEN %s AND %s GROUP BY DATE(date)", (current_user.id, start_date, end_date), fetch_all=True)
-        for row in results:
-            calories_data[row['log_date'].strftime('%Y-%m-%d')] = row['total_calories']
-        return jsonify({'success': True, 'dates': dates, 'calories': [calories_data[date] for date in dates], 'goal': current_user.daily_calories})
+        days, calories = get_daily_series(current_user.id, start_date, end_date, 'calories_in')
+        dates = [day.strftime('%Y-%m-%d') for day in days]
+        return jsonify({'success': True, 'dates': dates, 'calories': calories, 'goal': current_user.daily_calories})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
@@ -586,23 +881,162 @@ def api_chat():
         if not prompt:
             return jsonify({'reply': 'Please enter a message.'})
 
-        # Get chat history from the user's session, or start a new one
-        chat_history = session.get('chat_history', [])
-        
-        chat_history.append({"role": "user", "content": prompt})
+        # History lives in the server-side chat store; only the most recent
+        # turns that fit the token budget are sent to the model.
+        session.pop('chat_history', None)  # drop the old cookie-based history
+        store = chat_store.get_store()
+        store.append(current_user.id, "user", prompt)
+        chat_history = chat_store.build_context(current_user.id, app.config['CHAT_CONTEXT_TOKENS'])
 
         ai_reply = get_ai_chat_response(chat_history)
 
-        chat_history.append({"role": "assistant", "content": ai_reply})
-
-        session['chat_history'] = chat_history
+        store.append(current_user.id, "assistant", ai_reply)
 
         return jsonify({'reply': ai_reply})
     except Exception as e:
         return jsonify({'reply': f'An error occurred: {str(e)}'}), 500
 
 
+def _sse(payload):
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+@app.route('/api/chat/stream', methods=['POST'])
+@login_required
+def api_chat_stream():
+    """
+    Streams the assistant's reply as Server-Sent Events: one {"token": ...}
+    event per chunk, then {"done": true, "reply": <full text>}.
+    """
+    prompt = (request.json or {}).get('prompt')
+    if not prompt:
+        return jsonify({'reply': 'Please enter a message.'}), 400
+
+    session.pop('chat_history', None)  # drop the old cookie-based history
+    store = chat_store.get_store()
+    user_id = current_user.id
+    store.append(user_id, "user", prompt)
+    chat_history = chat_store.build_context(user_id, app.config['CHAT_CONTEXT_TOKENS'])
+
+    def generate():
+        reply = []
+        for token in stream_ai_chat_response(chat_history):
+            reply.append(token)
+            yield _sse({'token': token})
+        full_reply = ''.join(reply)
+        # History is server-side, so the finished reply is recorded here directly
+        store.append(user_id, "assistant", full_reply)
+        yield _sse({'done': True, 'reply': full_reply})
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Creates missing tables and indexes (no longer done at import time)."""
+    db.migrate()
+    click.echo("Database schema is up to date.")
+
+
+@app.cli.command('startup-report')
+@click.option('--top', default=15, help='Number of modules to list.')
+def startup_report_command(top):
+    """Imports the app in a fresh interpreter and lists what its own imports cost, slowest first."""
+    import subprocess
+    import sys
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True
+    )
+    # Lines look like "import time: <self us> | <cumulative us> | <2 spaces per level><module>"
+    # and come in post-order: a module's children are printed before the module itself
+    children = []
+    app_timing = None
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, self_us, cumulative_us, name = line.replace('import time:', '|', 1).split('|')
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        name = name.strip()
+        if depth == 1:
+            children.append((int(cumulative_us), int(self_us), name))
+        elif depth == 0:
+            if name == 'app':
+                app_timing = (int(cumulative_us), int(self_us))
+                break
+            # Interpreter bootstrap (site, encodings, ...) is not the app's cost
+            children = []
+    if app_timing is None:
+        click.echo(f"Could not import the app:\n{result.stderr[-2000:]}")
+        return
+    children.sort(reverse=True)
+    click.echo(f"Total import time for app: {app_timing[0] / 1000:.1f} ms "
+               f"({app_timing[1] / 1000:.1f} ms in app.py itself)")
+    click.echo(f"{'cumulative ms':>14} {'self ms':>9}  module imported by app")
+    for cumulative, self_us, name in children[:top]:
+        click.echo(f"{cumulative / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+
+
+@app.cli.command('nutrition-override')
+@click.argument('food_name')
+@click.option('--calories', type=float, required=True)
+@click.option('--protein', type=float, required=True)
+@click.option('--carbs', type=float, required=True)
+@click.option('--fat', type=float, required=True)
+def nutrition_override_command(food_name, calories, protein, carbs, fat):
+    """Pins the nutrition values returned for a food query (overrides the AI)."""
+    key = lookup_cache.set_nutrition_override(food_name, calories, protein, carbs, fat)
+    click.echo(f"Override saved for '{key}'.")
+
+
+@app.cli.command('pregenerate-plans')
+@click.option('--date', 'target_date', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Day to generate plans for (default: tomorrow, UTC).')
+def pregenerate_plans_command(target_date):
+    """Generates missing diet/workout plans for active users (run off-peak, e.g. from cron)."""
+    generated, skipped, failed = plan_scheduler.pregenerate_plans(target_date.date() if target_date else None)
+    click.echo(f"{generated} generated, {skipped} already present, {failed} failed.")
+
+
+@app.cli.command('import-logs')
+@click.argument('kind', type=click.Choice(['meals', 'workouts']))
+@click.argument('csv_file', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--email', required=True, help="Account to import into.")
+@click.option('--batch-size', default=log_import.CSV_BATCH_SIZE, show_default=True, help="Rows per transaction.")
+def import_logs_command(kind, csv_file, email, batch_size):
+    """Bulk-imports historical meals or workouts from a CSV file."""
+    user = User.get_by_email(email)
+    if not user:
+        raise click.ClickException(f"No user with email {email}")
+    try:
+        imported = log_import.import_csv(user.id, kind, csv_file, batch_size=batch_size)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Imported {imported} {kind}.")
+
+
+@app.cli.command('rebuild-daily-stats')
+@click.option('--user-id', type=int, default=None, help='Only rebuild this user (default: everyone).')
+def rebuild_daily_stats_command(user_id):
+    """Backfills/rebuilds the daily_user_stats rollup from the raw log tables."""
+    rows = rebuild_daily_stats(user_id)
+    click.echo(f"Rebuilt daily_user_stats: {rows} day rows.")
+
+
+@app.cli.command('repair-streaks')
+@click.option('--user-id', type=int, default=None, help='Only check this user (default: everyone).')
+@click.option('--fix', is_flag=True, help='Recompute streaks that disagree with the reference query.')
+def repair_streaks_command(user_id, fix):
+    """Checks stored streaks against the full-history CTE and optionally repairs them."""
+    mismatches = verify_streaks(user_id, fix=fix)
+    for uid, stored, expected in mismatches:
+        click.echo(f"user {uid}: stored {stored}, expected {expected}{' (fixed)' if fix else ''}")
+    click.echo(f"{len(mismatches)} mismatched streak(s).")
 
 
 if __name__ == '__main__':
+    # Convenience for local development; deployments run `flask migrate` once instead
+    db.migrate()
     app.run(debug=True)
\ No newline at end of file
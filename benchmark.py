@@ -0,0 +1,138 @@
+"""
+Drives the AI-backed pages of a running app and reports throughput and latency
+percentiles per scenario. Point the app at fake_groq.py to avoid spending quota:
+
+    python fake_groq.py --latency 400 &
+    GROQ_BASE_URL=http://localhost:8099 flask --app app run &
+    python benchmark.py --email bench@example.com --password secret -c 8 -n 200
+
+The account must exist and have a completed profile (otherwise /dashboard
+redirects to the profile page).
+"""
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+FOODS = ["2 boiled eggs", "bowl of oatmeal with banana", "chicken caesar salad", "1 cup brown rice",
+         "grilled salmon fillet", "peanut butter sandwich", "greek yogurt with honey", "beef burrito"]
+CHAT_PROMPTS = ["How much protein should I eat per day?", "Is it OK to run every day?",
+                "What should I eat before a workout?", "How can I sleep better after training?"]
+
+
+def _dashboard(session, base_url, args):
+    return session.get(f"{base_url}/dashboard", allow_redirects=False)
+
+
+def _chat(session, base_url, args):
+    return session.post(f"{base_url}/api/chat", json={'prompt': random.choice(CHAT_PROMPTS)})
+
+
+def _chat_stream(session, base_url, args):
+    response = session.post(f"{base_url}/api/chat/stream", json={'prompt': random.choice(CHAT_PROMPTS)}, stream=True)
+    for _ in response.iter_content(chunk_size=None):
+        pass
+    return response
+
+
+def _food(session, base_url, args):
+    food = random.choice(FOODS)
+    if args.unique_food:
+        # Defeat the nutrition cache so every request reaches the AI
+        food = f"{food} x{random.randint(1, 10 ** 9)}"
+    return session.post(f"{base_url}/api/get-food-details", json={'food_name': food})
+
+
+SCENARIOS = {
+    'dashboard': _dashboard,
+    'chat': _chat,
+    'chat-stream': _chat_stream,
+    'food': _food,
+}
+
+
+def login(base_url, email, password):
+    session = requests.Session()
+    response = session.post(f"{base_url}/login", data={'email': email, 'password': password}, allow_redirects=False)
+    if response.status_code != 302 or '/login' in response.headers.get('Location', ''):
+        raise SystemExit(f"Login failed for {email} (HTTP {response.status_code})")
+    return session
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+def run_scenario(name, args, sessions):
+    """Sends args.requests requests with args.concurrency workers. Returns a result dict."""
+    fn = SCENARIOS[name]
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal errors
+        session = sessions[i % len(sessions)]
+        started = time.perf_counter()
+        try:
+            response = fn(session, args.base_url, args)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(one, range(args.requests)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'scenario': name,
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': len(latencies) / wall if wall else 0.0,
+        'p50': percentile(latencies, 0.50) * 1000,
+        'p95': percentile(latencies, 0.95) * 1000,
+        'p99': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the AI-backed endpoints")
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--email', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('-c', '--concurrency', type=int, default=8)
+    parser.add_argument('-n', '--requests', type=int, default=100, help="requests per scenario")
+    parser.add_argument('--scenarios', default='dashboard,chat,food',
+                        help=f"comma-separated, from: {', '.join(SCENARIOS)}")
+    parser.add_argument('--unique-food', action='store_true', help="vary food names to bypass caches")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    # One logged-in session per worker, like separate browser tabs
+    sessions = [login(args.base_url, args.email, args.password) for _ in range(args.concurrency)]
+
+    print(f"{'scenario':<12} {'requests':>8} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name in names:
+        r = run_scenario(name, args, sessions)
+        print(f"{r['scenario']:<12} {r['requests']:>8} {r['errors']:>7} {r['throughput']:>8.1f} "
+              f"{r['p50']:>8.0f} {r['p95']:>8.0f} {r['p99']:>8.0f}")
+
+
+if __name__ == '__main__':
+    main()
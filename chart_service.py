@@ -0,0 +1,204 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+from cache import TTLCache
+from database import db, day_range
+from rollups import get_daily_series, get_daily_stats
+import graph_utils
+import profiling
+
+# Bump when render_plot_png changes so cached images are not reused across styles
+CHART_STYLE_VERSION = 1
+
+CHART_WORKERS = int(os.getenv('CHART_WORKERS', 2))
+CHART_RENDER_TIMEOUT = float(os.getenv('CHART_RENDER_TIMEOUT', 10))
+
+# content key -> PNG bytes
+_images = TTLCache(maxsize=512, ttl=24 * 3600)
+
+_executor = None
+_pending = {}   # key -> (future, pool running it)
+_lock = threading.RLock()
+
+
+def _get_executor():
+    """Starts the render pool on first use. 'spawn' keeps pyplot state out of the web process."""
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=CHART_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _executor
+
+
+# --- Chart definitions ---
+# Each builder returns (dates, values, title, label, color) for a user, or None
+# when there is not enough data to draw. The image endpoint calls the same
+# builder, so any worker process can serve any chart URL.
+
+def _weight_30d(user_id, today):
+    start, end = day_range(today - timedelta(days=29), today)
+    rows = db.execute_query(
+        "SELECT date, weight FROM weight_logs WHERE user_id = %s AND date >= %s AND date < %s ORDER BY date",
+        (user_id, start, end),
+        fetch_all=True
+    ) or []
+    if len(rows) < 2:
+        return None
+    return ([row['date'].strftime('%b %d') for row in rows], [float(row['weight']) for row in rows],
+            "Weight Progress (30 Days)", "Weight (kg)", "#4f46e5")
+
+
+def _calories_7d(user_id, today):
+    days, calories = get_daily_series(user_id, today - timedelta(days=6), today, 'calories_in')
+    if not any(v > 0 for v in calories):
+        return None
+    return ([day.strftime('%b %d') for day in days], calories,
+            "Calorie Trend (7 Days)", "Calories (kcal)", "#10b981")
+
+
+CHARTS = {
+    'weight-30d': _weight_30d,
+    'calories-7d': _calories_7d,
+}
+
+
+# --- Columnar chart data for client-side rendering ---
+
+CHART_DATA_RANGES = (7, 30, 90, 365)
+
+
+def _weight_series(user_id, start_day, end_day):
+    start, end = day_range(start_day, end_day)
+    rows = db.execute_query(
+        "SELECT date, weight FROM weight_logs WHERE user_id = %s AND date >= %s AND date < %s ORDER BY date",
+        (user_id, start, end),
+        fetch_all=True
+    ) or []
+    return {
+        'dates': [row['date'].strftime('%Y-%m-%d') for row in rows],
+        'weight': [float(row['weight']) for row in rows],
+    }
+
+
+def _rollup_series(*columns):
+    def series(user_id, start_day, end_day):
+        rows = {row['stat_date']: row for row in get_daily_stats(user_id, start_day, end_day)}
+        days = [start_day + timedelta(days=i) for i in range((end_day - start_day).days + 1)]
+        data = {'dates': [day.strftime('%Y-%m-%d') for day in days]}
+        for column in columns:
+            data[column] = [float(rows[day][column] or 0) if day in rows else 0.0 for day in days]
+        return data
+    return series
+
+
+CHART_DATA = {
+    'weight': _weight_series,
+    'calories': _rollup_series('calories_in'),
+    'macros': _rollup_series('protein', 'carbs', 'fat'),
+    'workout-burn': _rollup_series('calories_burned', 'workout_minutes'),
+}
+
+
+def chart_data(series, user_id, days, today=None):
+    """Returns a series as parallel arrays: {'dates': [...], '<column>': [...], ...}."""
+    today = today or datetime.utcnow().date()
+    data = CHART_DATA[series](user_id, today - timedelta(days=days - 1), today)
+    data.update({'series': series, 'days': days})
+    return data
+
+
+def chart_key(name, user_id, spec):
+    """Content hash of everything that affects the rendered image."""
+    dates, data, title, label, color = spec
+    payload = json.dumps(
+        [CHART_STYLE_VERSION, name, user_id, list(dates), [float(v) for v in data], title, label, color],
+        separators=(',', ':')
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def _discard(key, future, executor, broken=False):
+    """Forgets a finished render; a pool a dead worker broke is dropped so the next render starts a new one."""
+    global _executor
+    with _lock:
+        if key in _pending and _pending[key][0] is future:
+            del _pending[key]
+        if broken and _executor is executor:
+            _executor = None
+
+
+def _finish(key, future, executor):
+    error = None if future.cancelled() else future.exception()
+    _discard(key, future, executor, broken=isinstance(error, BrokenProcessPool))
+    if not future.cancelled() and error is None:
+        _images.set(key, future.result())
+
+
+def _submit(key, spec):
+    """Queues a render unless one for this key is already in flight. Returns (future, pool)."""
+    with _lock:
+        if key in _pending:
+            return _pending[key]
+        executor = _get_executor()
+        try:
+            future = executor.submit(graph_utils.render_plot_png, *spec)
+        except BrokenProcessPool:
+            _discard(key, None, executor, broken=True)
+            executor = _get_executor()
+            future = executor.submit(graph_utils.render_plot_png, *spec)
+        _pending[key] = (future, executor)
+        future.add_done_callback(lambda f: _finish(key, f, executor))
+        return future, executor
+
+
+def build_chart(name, user_id, today=None):
+    """Returns (key, spec) for a named chart, or (None, None) if it has no data yet."""
+    spec = CHARTS[name](user_id, today or datetime.utcnow().date())
+    if spec is None:
+        return None, None
+    return chart_key(name, user_id, spec), spec
+
+
+@profiling.timed('chart')
+def prepare_chart(name, user_id, today=None):
+    """
+    Builds a named chart and starts rendering it in the background so the
+    image is usually ready by the time the browser asks for it. Returns the
+    content key for the image URL, or None if there is nothing to draw.
+    """
+    key, spec = build_chart(name, user_id, today)
+    if key is not None and _images.get(key) is None:
+        _submit(key, spec)
+    return key
+
+
+@profiling.timed('chart')
+def render_chart(key, spec):
+    """Returns the PNG bytes for a built chart, rendering it if not cached."""
+    png = _images.get(key)
+    if png is None:
+        for attempt in range(2):
+            future, executor = _submit(key, spec)
+            try:
+                png = future.result(timeout=CHART_RENDER_TIMEOUT)
+                break
+            except BrokenProcessPool:
+                # A worker died (OOM, a crash in matplotlib): retry once on a new pool
+                _discard(key, future, executor, broken=True)
+                if attempt:
+                    raise
+        _images.set(key, png)
+    return png
+
+
+def stats():
+    return {'images': _images.stats(), 'pending': len(_pending)}
@@ -0,0 +1,92 @@
+import threading
+from collections import defaultdict, deque
+
+from database import db
+
+# Rough token estimate (~4 characters per token plus per-message overhead);
+# good enough for budgeting context without pulling in a tokenizer.
+def estimate_tokens(text):
+    return len(text or '') // 4 + 4
+
+
+class MemoryChatStore:
+    """Per-process store for development and tests. Keeps the last `max_messages` per user."""
+
+    def __init__(self, max_messages=200):
+        self._messages = defaultdict(lambda: deque(maxlen=max_messages))
+        self._lock = threading.Lock()
+
+    def append(self, user_id, role, content):
+        with self._lock:
+            self._messages[user_id].append({'role': role, 'content': content})
+
+    def recent(self, user_id, limit):
+        """Returns up to `limit` most recent messages, oldest first."""
+        with self._lock:
+            return list(self._messages[user_id])[-limit:]
+
+    def clear(self, user_id):
+        with self._lock:
+            self._messages.pop(user_id, None)
+
+
+class DbChatStore:
+    """Stores chat turns in the chat_messages table."""
+
+    def append(self, user_id, role, content):
+        db.execute_query(
+            "INSERT INTO chat_messages (user_id, role, content) VALUES (%s, %s, %s)",
+            (user_id, role, content),
+            commit=True
+        )
+
+    def recent(self, user_id, limit):
+        """Returns up to `limit` most recent messages, oldest first."""
+        rows = db.execute_query(
+            """SELECT role, content FROM chat_messages
+               WHERE user_id = %s ORDER BY id DESC LIMIT %s""",
+            (user_id, limit),
+            fetch_all=True
+        ) or []
+        return [{'role': row['role'], 'content': row['content']} for row in reversed(rows)]
+
+    def clear(self, user_id):
+        db.execute_query("DELETE FROM chat_messages WHERE user_id = %s", (user_id,), commit=True)
+
+
+_BACKENDS = {'db': DbChatStore, 'memory': MemoryChatStore}
+_store = None
+
+
+def configure(backend='db'):
+    global _store
+    _store = _BACKENDS[backend]()
+    return _store
+
+
+def get_store():
+    return _store or configure()
+
+
+def build_context(user_id, token_budget, max_messages=50):
+    """
+    Returns the most recent turns that fit in `token_budget`, oldest first.
+    Older turns are dropped (with a short note so the model knows), keeping
+    prompt size, and so per-turn cost and latency, flat as a chat grows.
+    """
+    messages = get_store().recent(user_id, max_messages)
+    context = []
+    used = 0
+    for message in reversed(messages):
+        cost = estimate_tokens(message['content'])
+        if context and used + cost > token_budget:
+            break
+        context.append(message)
+        used += cost
+    context.reverse()
+    # The model expects the conversation to start with a user turn
+    while len(context) > 1 and context[0]['role'] != 'user':
+        context.pop(0)
+    if len(context) < len(messages):
+        context.insert(0, {'role': 'system', 'content': 'Earlier parts of this conversation were omitted for length.'})
+    return context
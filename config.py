@@ -15,6 +15,67 @@ class Config:
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'images', 'profile_photos')
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
     GROQ_API_KEY = os.getenv('GROQ_API_KEY')
+    # Point at another chat-completions server, e.g. `python fake_groq.py` for load tests
+    GROQ_BASE_URL = os.getenv('GROQ_BASE_URL') or None
+
+    # Draw dashboard charts in the browser from /api/chart-data instead of server-side PNGs
+    CLIENT_SIDE_CHARTS = os.getenv('CLIENT_SIDE_CHARTS', 'false').lower() == 'true'
+
+    # Per-process cache of user rows for the Flask-Login user_loader
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 1024))
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 300))
+
+    # Nutrition lookups: in-process LRU in front of the shared nutrition_cache table
+    NUTRITION_CACHE_SIZE = int(os.getenv('NUTRITION_CACHE_SIZE', 2048))
+    NUTRITION_MEMORY_TTL = int(os.getenv('NUTRITION_MEMORY_TTL', 600))
+    NUTRITION_CACHE_TTL_DAYS = int(os.getenv('NUTRITION_CACHE_TTL_DAYS', 30))
+
+    # Workout calorie estimates: cache plus MET fallback when the AI is slower than this
+    WORKOUT_CACHE_SIZE = int(os.getenv('WORKOUT_CACHE_SIZE', 2048))
+    WORKOUT_CACHE_TTL = int(os.getenv('WORKOUT_CACHE_TTL', 7 * 24 * 3600))
+    WORKOUT_AI_TIMEOUT = float(os.getenv('WORKOUT_AI_TIMEOUT', 3))
+
+    # AI plan generation: bounded background workers (rate limited by ai_client), plus an optional
+    # in-process nightly run (enable in one process only, or use `flask pregenerate-plans`)
+    PLAN_WORKERS = int(os.getenv('PLAN_WORKERS', 2))
+    PLAN_SCHEDULER_ENABLED = os.getenv('PLAN_SCHEDULER_ENABLED', 'false').lower() == 'true'
+    PLAN_PREGEN_HOUR = int(os.getenv('PLAN_PREGEN_HOUR', 22))
+
+    # Shared Groq client policy: overall deadline per call, retries on transient
+    # errors, a token bucket sized to the API quota and a circuit breaker
+    AI_CALL_TIMEOUT = float(os.getenv('AI_CALL_TIMEOUT', 20))
+    AI_MAX_RETRIES = int(os.getenv('AI_MAX_RETRIES', 2))
+    AI_RATE_PER_MINUTE = int(os.getenv('AI_RATE_PER_MINUTE', 30))
+    AI_BREAKER_THRESHOLD = int(os.getenv('AI_BREAKER_THRESHOLD', 5))
+    AI_BREAKER_RESET = int(os.getenv('AI_BREAKER_RESET', 30))
+
+    # Background report exports: rendered in EXPORT_WORKERS processes, kept on local disk for EXPORT_TTL seconds
+    EXPORT_DIR = os.getenv('EXPORT_DIR')  # default: <tmp>/fittracker-exports
+    EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', 2))
+    EXPORT_TTL = int(os.getenv('EXPORT_TTL', 24 * 3600))
+
+    # AI chat: server-side history ('db' or 'memory') and the prompt budget per turn
+    CHAT_STORE = os.getenv('CHAT_STORE', 'db')
+    CHAT_CONTEXT_TOKENS = int(os.getenv('CHAT_CONTEXT_TOKENS', 1500))
+
+    # Dashboard sections cached per user, keyed on the data versions they depend on
+    DASHBOARD_CACHE_SIZE = int(os.getenv('DASHBOARD_CACHE_SIZE', 4096))
+    DASHBOARD_CACHE_TTL = int(os.getenv('DASHBOARD_CACHE_TTL', 600))
+
+    # Request profiling: per-route db/ai/chart/template time on /metrics (Prometheus text),
+    # an optional Server-Timing header, and a sampled log line for slow requests
+    PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'true').lower() == 'true'
+    SERVER_TIMING_HEADER = os.getenv('SERVER_TIMING_HEADER', 'false').lower() == 'true'
+    SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', 1000))
+    SLOW_REQUEST_SAMPLE = float(os.getenv('SLOW_REQUEST_SAMPLE', 0.1))
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')  # /metrics, /api/*-stats are off unless set; then require 'Authorization: Bearer <token>'
+
+    # Development/test (always on in debug mode): record each request's queries, report duplicates
+    # and N+1 patterns, and check per-endpoint budgets, added to query_debug.DEFAULT_BUDGETS
+    # ("dashboard=10,log_meal=5"); strict, or debug mode, makes overruns fail
+    DB_DEBUG_QUERIES = os.getenv('DB_DEBUG_QUERIES', 'false').lower() == 'true'
+    QUERY_BUDGETS = os.getenv('QUERY_BUDGETS', '')
+    QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', 'false').lower() == 'true'
     
     @staticmethod
     def init_app(app):
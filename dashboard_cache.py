@@ -0,0 +1,61 @@
+from cache import TTLCache
+from database import db
+from sync_log import DATA_KINDS
+
+# --- Dashboard section cache ---
+# Most dashboard views come right after another one with nothing logged in
+# between. Each section's data is cached per user under the versions of the
+# data it is built from (kept in user_sync_state and moved by every meal,
+# workout, weight and profile write, see sync_log.py) plus the day. Logging a
+# meal therefore recomputes today's totals, the streak and the calorie chart,
+# while the weight chart and the plans keep coming from the cache. The versions
+# live in MySQL, so a write handled by one worker invalidates every worker.
+
+# Section -> the kinds of data it is built from
+SECTIONS = {
+    'today': ('meal', 'workout'),
+    'streak': ('meal',),
+    'weight_chart': ('weight',),
+    'calorie_chart': ('meal',),
+    'plans': ('profile',),
+}
+
+_sections = TTLCache(maxsize=4096, ttl=600)
+
+
+def configure(size=4096, ttl=600):
+    global _sections
+    _sections = TTLCache(maxsize=size, ttl=ttl)
+
+
+def data_versions(user_id):
+    """Returns {kind: version} for the user; all 0 before their first write."""
+    # Connections autocommit, so this plain read sees the latest committed
+    # versions without locking the row against the user's next write
+    row = db.execute_query(
+        f"""SELECT {', '.join(f'{kind}_seq AS {kind}' for kind in DATA_KINDS)}
+            FROM user_sync_state WHERE user_id = %s""",
+        (user_id,),
+        fetch_one=True
+    )
+    return {kind: row[kind] if row else 0 for kind in DATA_KINDS}
+
+
+def get_section(user_id, section, versions, today, build, cache_if=None):
+    """
+    Returns the section's cached value if none of its data changed, otherwise
+    build() (cached unless cache_if(value) is false). The versions must be read
+    before building, so a value is never cached under a newer version than its data.
+    """
+    key = (user_id, section, today, tuple(versions[kind] for kind in SECTIONS[section]))
+    entry = _sections.get(key)
+    if entry is not None:
+        return entry[0]
+    value = build()
+    if cache_if is None or cache_if(value):
+        _sections.set(key, (value,))
+    return value
+
+
+def stats():
+    return _sections.stats()
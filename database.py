@@ -1,47 +1,541 @@
 import mysql.connector
 from mysql.connector import Error
 from contextlib import contextmanager
+from contextvars import ContextVar
+from queue import Queue, Empty
+import logging
+import re
+import threading
+import time
 import os
+from datetime import datetime, time as dt_time, timedelta
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+
+# Secondary indexes for the per-user log tables. Every hot query filters on
+# user_id plus a date range, so (user_id, date) leads each index; trailing
+# columns let the dashboard aggregates be answered from the index alone.
+LOG_TABLE_INDEXES = [
+    ('meal_logs', 'idx_meal_logs_user_date', '(user_id, date, calories)'),
+    ('workout_logs', 'idx_workout_logs_user_date', '(user_id, date, calories_burned)'),
+    ('weight_logs', 'idx_weight_logs_user_date', '(user_id, date, weight)'),
+    # Offline sync reads "everything after this sequence number" (see sync_log.py)
+    ('meal_logs', 'idx_meal_logs_user_sync', '(user_id, sync_seq)'),
+    ('workout_logs', 'idx_workout_logs_user_sync', '(user_id, sync_seq)'),
+    ('weight_logs', 'idx_weight_logs_user_sync', '(user_id, sync_seq)'),
+]
+
+# Columns added to existing tables after their first release
+ADDED_COLUMNS = [
+    ('meal_logs', 'sync_seq', 'BIGINT NULL'),
+    ('workout_logs', 'sync_seq', 'BIGINT NULL'),
+    ('weight_logs', 'sync_seq', 'BIGINT NULL'),
+    # Per-kind data versions for the dashboard cache (see sync_log.DATA_KINDS)
+    ('user_sync_state', 'meal_seq', 'BIGINT NOT NULL DEFAULT 0'),
+    ('user_sync_state', 'workout_seq', 'BIGINT NOT NULL DEFAULT 0'),
+    ('user_sync_state', 'weight_seq', 'BIGINT NOT NULL DEFAULT 0'),
+    ('user_sync_state', 'profile_seq', 'BIGINT NOT NULL DEFAULT 0'),
+]
+
+
+def day_range(start_day, end_day=None):
+    """
+    Turns an inclusive day filter into a half-open [start, end) datetime range.
+
+    Use this instead of `DATE(date) = %s` / `DATE(date) >= %s` so MySQL can
+    range-scan the (user_id, date) indexes:
+
+        start, end = day_range(today)
+        "... WHERE user_id = %s AND date >= %s AND date < %s", (uid, start, end)
+    """
+    if isinstance(start_day, datetime):
+        start_day = start_day.date()
+    if end_day is None:
+        end_day = start_day
+    elif isinstance(end_day, datetime):
+        end_day = end_day.date()
+    start = datetime.combine(start_day, dt_time.min)
+    end = datetime.combine(end_day + timedelta(days=1), dt_time.min)
+    return start, end
+
+
+class PoolExhaustedError(Error):
+    """Raised when no connection could be checked out before the timeout."""
+
+
+class ConnectionPool:
+    """
+    A small thread-safe pool of MySQL connections.
+
+    Connections are created lazily up to `size`, handed out one per checkout
+    and health-checked (ping + reconnect) before being returned to a caller.
+    """
+
+    def __init__(self, size=5, timeout=10.0, **connect_args):
+        self.size = size
+        self.timeout = timeout
+        self.connect_args = connect_args
+        self._idle = Queue(maxsize=size)
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+
+        # Metrics
+        self._checkouts = 0
+        self._reconnects = 0
+        self._timeouts = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_checkout_time = 0.0
+
+    def _new_connection(self):
+        # Autocommit, so a plain read never leaves a transaction (and its stale
+        # snapshot) open on a pooled connection; writes use explicit transactions
+        return mysql.connector.connect(autocommit=True, **self.connect_args)
+
+    def _ensure_healthy(self, conn):
+        """Pings the connection, reconnecting if the server dropped it."""
+        try:
+            conn.ping(reconnect=False)
+            return conn
+        except Error:
+            with self._lock:
+                self._reconnects += 1
+            try:
+                conn.reconnect(attempts=2, delay=0)
+                return conn
+            except Error:
+                try:
+                    conn.close()
+                except Error:
+                    pass
+                return self._new_connection()
+
+    def acquire(self):
+        start = time.perf_counter()
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+        except Empty:
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    conn = self._new_connection()
+                except Error:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except Empty:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise PoolExhaustedError(
+                        msg=f"No database connection available after {self.timeout}s (pool size {self.size})"
+                    )
+
+        try:
+            conn = self._ensure_healthy(conn)
+        except Error:
+            with self._lock:
+                self._created -= 1
+            raise
+
+        waited = time.perf_counter() - start
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+        return conn, time.perf_counter()
+
+    def release(self, conn, checked_out_at, discard=False):
+        held = time.perf_counter() - checked_out_at
+        with self._lock:
+            self._in_use -= 1
+            self._total_checkout_time += held
+        if not discard and conn.in_transaction:
+            # Whatever left a transaction open, the next borrower must not inherit it
+            try:
+                conn.rollback()
+            except Error:
+                discard = True
+        if discard:
+            try:
+                conn.close()
+            except Error:
+                pass
+            with self._lock:
+                self._created -= 1
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn, checked_out_at = self.acquire()
+        discard = False
+        try:
+            yield conn
+        except Error:
+            # A connection that failed mid-query may be in an unknown state.
+            discard = not conn.is_connected()
+            raise
+        finally:
+            self.release(conn, checked_out_at, discard=discard)
+
+    def stats(self):
+        with self._lock:
+            checkouts = self._checkouts or 1
+            return {
+                'size': self.size,
+                'created': self._created,
+                'in_use': self._in_use,
+                'idle': self._idle.qsize(),
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'reconnects': self._reconnects,
+                'avg_wait_ms': self._total_wait / checkouts * 1000,
+                'max_wait_ms': self._max_wait * 1000,
+                'avg_checkout_ms': self._total_checkout_time / checkouts * 1000,
+            }
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except Empty:
+                break
+            try:
+                conn.close()
+            except Error:
+                pass
+            with self._lock:
+                self._created -= 1
+
+
+# --- Query debugging ---
+# Database.record_queries() collects every statement run in a block (normally
+# one request, see query_debug.py) so repeated work shows up: the same
+# statement with the same parameters run twice, or the same statement run once
+# per item of a list (N+1) where one query with IN (...) or a JOIN would do.
+
+# A statement run this many times with different parameters is reported as N+1
+N_PLUS_ONE_THRESHOLD = 3
+
+_IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+_active_query_logs = ContextVar('active_query_logs', default=())
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a block or route runs more queries than its budget allows."""
+
+
+def statement_shape(query):
+    """The statement with whitespace collapsed and IN (%s, %s, ...) lists folded together."""
+    return _IN_LIST.sub('(%s, ...)', _WHITESPACE.sub(' ', str(query)).strip())
+
+
+class QueryLog:
+    """The statements run inside one record_queries() block, in order."""
+
+    def __init__(self, label=None):
+        self.label = label
+        self.queries = []   # (statement, params, seconds)
+        self._token = None
+
+    def add(self, query, params, seconds):
+        self.queries.append((statement_shape(query), params, seconds))
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_seconds(self):
+        return sum(seconds for _, _, seconds in self.queries)
+
+    def duplicates(self):
+        """[(statement, params, times)] for statements run more than once with identical parameters."""
+        runs = {}
+        for statement, params, _ in self.queries:
+            key = (statement, repr(params))
+            runs.setdefault(key, [statement, params, 0])[2] += 1
+        return [tuple(run) for run in runs.values() if run[2] > 1]
+
+    def n_plus_one(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """[(statement, times)] for statements run at least `threshold` times with differing parameters."""
+        params_seen = {}
+        for statement, params, _ in self.queries:
+            params_seen.setdefault(statement, []).append(repr(params))
+        return [(statement, len(seen)) for statement, seen in params_seen.items()
+                if len(seen) >= threshold and len(set(seen)) > 1]
+
+    def report(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """A readable summary: totals, then any duplicates and N+1 patterns."""
+        lines = [f"{self.label or 'block'}: {self.count} queries in {self.total_seconds * 1000:.1f}ms"]
+        for statement, params, times in self.duplicates():
+            lines.append(f"  duplicate x{times}: {statement[:200]} {params!r:.100}")
+        for statement, times in self.n_plus_one(threshold):
+            lines.append(f"  N+1 x{times}: {statement[:200]}")
+        return '\n'.join(lines)
+
+
+def _record_to_active_logs(query, params, seconds):
+    for log in _active_query_logs.get():
+        log.add(query, params, seconds)
+
+
+class StreamLimitError(Error):
+    """Raised when DB_STREAM_LIMIT streamed queries are already running."""
+
+
+class _StreamSlot:
+    """One of the DB_STREAM_LIMIT slots; release() is safe to call more than once."""
+
+    def __init__(self, semaphore):
+        self._semaphore = semaphore
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._semaphore.release()
+
+
+def _stream_rows(database, query, params, batch_size, slot):
+    conn = None
+    try:
+        conn = database.pool._new_connection()
+        cursor = database._cursor(conn)
+        cursor.execute(query, params or ())
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+        cursor.close()
+    except Error as e:
+        logger.error("Error streaming query: %s", e)
+        raise
+    finally:
+        # Closing drops any unread rows with the connection instead of draining them
+        if conn is not None:
+            try:
+                conn.close()
+            except Error:
+                pass
+        slot.release()
+
+
+class RowStream:
+    """
+    Iterator over a streamed query on its own connection (see Database.stream_query).
+    The connection and the stream slot are released when the rows run out, on
+    close(), or as soon as the iterator is dropped (it holds no reference cycle).
+    """
+
+    def __init__(self, database, query, params, batch_size):
+        self._slot = _StreamSlot(database._stream_slots)
+        self._rows = _stream_rows(database, query, params, batch_size, self._slot)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._rows)
+
+    def close(self):
+        self._rows.close()
+        self._slot.release()
+
+    def __del__(self):
+        self.close()
+
+
+class _ObservedCursor:
+    """Cursor wrapper that reports each statement and its duration to the query listeners."""
+
+    def __init__(self, cursor, listeners):
+        self._cursor = cursor
+        self._listeners = listeners
+
+    def _notify(self, query, params, started):
+        seconds = time.perf_counter() - started
+        for listener in self._listeners:
+            try:
+                listener(query, params, seconds)
+            except Exception as e:
+                logger.warning("Query listener failed: %s", e)
+
+    def execute(self, query, params=None, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(query, params, *args, **kwargs)
+        finally:
+            self._notify(query, params, started)
+
+    def executemany(self, query, seq_params, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, seq_params, *args, **kwargs)
+        finally:
+            self._notify(query, seq_params, started)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
 class Database:
     def __init__(self):
-        self.connection = None
-        self.connect()
-        self.initialize_db()
+        # Nothing talks to MySQL until the first query, so importing this module
+        # is cheap. Schema changes run explicitly via migrate() / `flask migrate`.
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._query_listeners = []
+        self.stream_limit = int(os.getenv('DB_STREAM_LIMIT', 4))
+        self._stream_slots = threading.BoundedSemaphore(self.stream_limit)
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self.connect()
+        return self._pool
 
     def connect(self):
         try:
-            self.connection = mysql.connector.connect(
+            pool = ConnectionPool(
+                size=int(os.getenv('DB_POOL_SIZE', 5)),
+                timeout=float(os.getenv('DB_POOL_TIMEOUT', 10)),
                 host=os.getenv('DB_HOST', 'localhost'),
                 database=os.getenv('DB_NAME', 'fitness_tracker'),
                 user=os.getenv('DB_USER', 'root'),
                 password=os.getenv('DB_PASSWORD', '')
             )
-            if self.connection.is_connected():
-                print("Connected to MySQL database")
+            # Open one connection up front so configuration errors surface on first use
+            with pool.connection() as conn:
+                if conn.is_connected():
+                    print(f"Connected to MySQL database (pool size {pool.size})")
+            self._pool = pool
         except Error as e:
             print(f"Error connecting to MySQL: {e}")
             raise
 
+    def add_query_listener(self, listener):
+        """
+        Calls listener(query, params, seconds) after every statement run through
+        get_cursor/execute_query/stream_query (on the thread that ran it).
+        Cursors are only wrapped while at least one listener is registered.
+        """
+        if listener not in self._query_listeners:
+            self._query_listeners = self._query_listeners + [listener]
+
+    def remove_query_listener(self, listener):
+        self._query_listeners = [l for l in self._query_listeners if l is not listener]
+
+    def begin_query_log(self, label=None):
+        """
+        Starts recording the statements run on this thread (or asyncio task)
+        into a new QueryLog; stop with end_query_log(). Logs can nest.
+        """
+        self.add_query_listener(_record_to_active_logs)
+        log = QueryLog(label)
+        log._token = _active_query_logs.set(_active_query_logs.get() + (log,))
+        return log
+
+    def end_query_log(self, log):
+        if log._token is not None:
+            _active_query_logs.reset(log._token)
+            log._token = None
+        return log
+
     @contextmanager
-    def get_cursor(self):
-        cursor = None
+    def record_queries(self, label=None):
+        """Collects every statement run in the block into the yielded QueryLog."""
+        log = self.begin_query_log(label)
         try:
-            cursor = self.connection.cursor(dictionary=True)
-            yield cursor
-        except Error as e:
-            print(f"Database error: {e}")
-            raise
+            yield log
         finally:
-            if cursor:
-                cursor.close()
+            self.end_query_log(log)
+
+    @contextmanager
+    def assert_max_queries(self, budget, label=None, allow_duplicates=True):
+        """
+        Fails with QueryBudgetExceeded if the block runs more than `budget`
+        statements (or, with allow_duplicates=False, any duplicate or N+1).
+        For tests, e.g. `with db.assert_max_queries(8): client.get('/dashboard')`.
+        """
+        with self.record_queries(label) as log:
+            yield log
+        if log.count > budget:
+            raise QueryBudgetExceeded(f"query budget {budget} exceeded\n{log.report()}")
+        if not allow_duplicates and (log.duplicates() or log.n_plus_one()):
+            raise QueryBudgetExceeded(f"repeated queries\n{log.report()}")
+
+    def _cursor(self, conn, **options):
+        cursor = conn.cursor(dictionary=True, **options)
+        if self._query_listeners:
+            return _ObservedCursor(cursor, self._query_listeners)
+        return cursor
+
+    @contextmanager
+    def connection(self):
+        """Checks a connection out of the pool for the duration of the block."""
+        with self.pool.connection() as conn:
+            yield conn
+
+    @contextmanager
+    def get_cursor(self, commit=False, snapshot=False):
+        """
+        Yields a dictionary cursor on a pooled connection. With commit=True the
+        block runs in one transaction, committed at the end and rolled back on
+        error; otherwise each statement commits on its own. snapshot=True runs
+        the block as one read-only transaction on a consistent snapshot, so all
+        of its reads see the same data. The connection is then returned to the pool.
+        """
+        with self.pool.connection() as conn:
+            cursor = None
+            try:
+                if snapshot:
+                    conn.start_transaction(consistent_snapshot=True, readonly=True)
+                elif commit:
+                    conn.start_transaction()
+                cursor = self._cursor(conn, buffered=True)
+                yield cursor
+                if commit or snapshot:
+                    conn.commit()
+            except BaseException as e:
+                # Not only database errors: a ValueError from validation code (or a
+                # GeneratorExit) mid-block must not leave the transaction open
+                if isinstance(e, Error):
+                    logger.error("Database error: %s", e)
+                try:
+                    conn.rollback()
+                except Error:
+                    pass
+                raise
+            finally:
+                if cursor:
+                    cursor.close()
 
     def initialize_db(self):
         try:
-            with self.get_cursor() as cursor:
+            with self.get_cursor(commit=True) as cursor:
                 # Create users table
                 cursor.execute("""
                     CREATE TABLE IF NOT EXISTS users (
@@ -106,32 +600,183 @@ class Database:
                     )
                 """)
 
-                self.connection.commit()
+                # Create daily_user_stats rollup table (maintained by rollups.py)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS daily_user_stats (
+                        user_id INT NOT NULL,
+                        stat_date DATE NOT NULL,
+                        calories_in FLOAT NOT NULL DEFAULT 0,
+                        protein FLOAT NOT NULL DEFAULT 0,
+                        carbs FLOAT NOT NULL DEFAULT 0,
+                        fat FLOAT NOT NULL DEFAULT 0,
+                        meal_count INT NOT NULL DEFAULT 0,
+                        calories_burned FLOAT NOT NULL DEFAULT 0,
+                        workout_minutes INT NOT NULL DEFAULT 0,
+                        workout_count INT NOT NULL DEFAULT 0,
+                        PRIMARY KEY (user_id, stat_date),
+                        FOREIGN KEY (user_id) REFERENCES users(id)
+                    )
+                """)
+
+                # Create user_streaks table (maintained by streaks.py)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS user_streaks (
+                        user_id INT PRIMARY KEY,
+                        current_streak INT NOT NULL DEFAULT 0,
+                        longest_streak INT NOT NULL DEFAULT 0,
+                        last_active_date DATE,
+                        streak_start_date DATE,
+                        FOREIGN KEY (user_id) REFERENCES users(id)
+                    )
+                """)
+
+                # Create daily_plans table (AI plan HTML per user/day, see plans.py)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS daily_plans (
+                        id INT AUTO_INCREMENT PRIMARY KEY,
+                        user_id INT NOT NULL,
+                        date DATE NOT NULL,
+                        plan_type VARCHAR(20) NOT NULL,
+                        html_content TEXT,
+                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        UNIQUE KEY uq_daily_plans_user_date_type (user_id, date, plan_type),
+                        FOREIGN KEY (user_id) REFERENCES users(id)
+                    )
+                """)
+
+                # Create chat_messages table (server-side AI chat history, see chat_store.py)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS chat_messages (
+                        id INT AUTO_INCREMENT PRIMARY KEY,
+                        user_id INT NOT NULL,
+                        role VARCHAR(20) NOT NULL,
+                        content TEXT NOT NULL,
+                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        INDEX idx_chat_messages_user (user_id, id),
+                        FOREIGN KEY (user_id) REFERENCES users(id)
+                    )
+                """)
+
+                # Offline sync bookkeeping (see sync_log.py / sync.py): the per-user
+                # change counter, deletions, and idempotency keys of applied entries
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS user_sync_state (
+                        user_id INT PRIMARY KEY,
+                        seq BIGINT NOT NULL DEFAULT 0,
+                        meal_seq BIGINT NOT NULL DEFAULT 0,
+                        workout_seq BIGINT NOT NULL DEFAULT 0,
+                        weight_seq BIGINT NOT NULL DEFAULT 0,
+                        profile_seq BIGINT NOT NULL DEFAULT 0,
+                        FOREIGN KEY (user_id) REFERENCES users(id)
+                    )
+                """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS sync_tombstones (
+                        user_id INT NOT NULL,
+                        seq BIGINT NOT NULL,
+                        entry_type VARCHAR(20) NOT NULL,
+                        log_id INT NOT NULL,
+                        deleted_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (user_id, seq),
+                        FOREIGN KEY (user_id) REFERENCES users(id)
+                    )
+                """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS sync_receipts (
+                        user_id INT NOT NULL,
+                        idempotency_key VARCHAR(64) NOT NULL,
+                        entry_type VARCHAR(20) NOT NULL,
+                        log_id INT NOT NULL,
+                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (user_id, idempotency_key),
+                        FOREIGN KEY (user_id) REFERENCES users(id)
+                    )
+                """)
+
+                # Create nutrition_cache table (shared AI nutrition lookups, see lookup_cache.py)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS nutrition_cache (
+                        query_key VARCHAR(255) PRIMARY KEY,
+                        calories FLOAT NOT NULL,
+                        protein FLOAT NOT NULL,
+                        carbs FLOAT NOT NULL,
+                        fat FLOAT NOT NULL,
+                        source VARCHAR(20) NOT NULL DEFAULT 'ai',
+                        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        expires_at DATETIME NULL
+                    )
+                """)
+            self.migrate_columns()
+            self.migrate_indexes()
         except Error as e:
             print(f"Error initializing database: {e}")
             raise
 
+    def migrate(self):
+        """Creates missing tables and indexes. Run once per deploy, not per worker boot."""
+        self.initialize_db()
+
+    def migrate_columns(self):
+        """Adds the columns in ADDED_COLUMNS to existing tables if missing."""
+        with self.get_cursor(commit=True) as cursor:
+            for table, column, definition in ADDED_COLUMNS:
+                cursor.execute(
+                    """SELECT COUNT(*) AS n FROM information_schema.columns
+                       WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s""",
+                    (table, column)
+                )
+                if cursor.fetchone()['n'] == 0:
+                    print(f"Adding column {column} to {table}")
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def migrate_indexes(self):
+        """Adds the composite indexes in LOG_TABLE_INDEXES to the log tables if missing."""
+        with self.get_cursor(commit=True) as cursor:
+            for table, index_name, columns in LOG_TABLE_INDEXES:
+                cursor.execute(
+                    """SELECT COUNT(*) AS n FROM information_schema.statistics
+                       WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s""",
+                    (table, index_name)
+                )
+                if cursor.fetchone()['n'] == 0:
+                    print(f"Creating index {index_name} on {table}")
+                    cursor.execute(f"CREATE INDEX {index_name} ON {table} {columns}")
+
     def execute_query(self, query, params=None, fetch_one=False, fetch_all=False, commit=False):
         try:
-            with self.get_cursor() as cursor:
+            with self.get_cursor(commit=commit) as cursor:
                 cursor.execute(query, params or ())
-                
-                if commit:
-                    self.connection.commit()
-                
+
                 if fetch_one:
                     return cursor.fetchone()
                 elif fetch_all:
                     return cursor.fetchall()
                 return None
         except Error as e:
-            print(f"Error executing query: {e}")
-            self.connection.rollback()
+            logger.error("Error executing query: %s", e)
             raise
 
+    def stream_query(self, query, params=None, batch_size=500):
+        """
+        Returns an iterator of result rows (as dicts) that never loads the whole
+        result set.
+
+        The rows come over a dedicated connection opened for this stream, not a
+        pooled one: a slow or stalled download must not hold a connection the
+        dashboard and API need. At most DB_STREAM_LIMIT streams run at once per
+        process; beyond that StreamLimitError is raised right away, before any
+        rows (or response headers) are produced.
+        """
+        if not self._stream_slots.acquire(blocking=False):
+            raise StreamLimitError(msg=f"Too many exports streaming right now (limit {self.stream_limit})")
+        return RowStream(self, query, params, batch_size)
+
+    def pool_stats(self):
+        return self._pool.stats() if self._pool else {}
+
     def close(self):
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
+        if self._pool:
+            self._pool.close_all()
 
-# Singleton database instance
-db = Database()
\ No newline at end of file
+# Singleton database instance (connects lazily on first query)
+db = Database()
@@ -0,0 +1,288 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+from types import SimpleNamespace
+
+from database import db, day_range
+
+# --- Background report exports ---
+# Each job renders one PDF/Excel report in a process-pool worker and leaves the
+# artifact in EXPORT_DIR next to a small JSON status file. Everything a poll or
+# download needs is on disk, so any web worker on the host can answer for any
+# job. The job id is a hash of (user, type, range, data fingerprint): asking for
+# the same report while nothing changed returns the existing job instead of
+# rendering it again.
+
+JOB_TYPES = {
+    'pdf': ('pdf', 'application/pdf'),
+    'excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+_settings = {
+    'directory': os.path.join(tempfile.gettempdir(), 'fittracker-exports'),
+    'ttl': 24 * 3600,
+    'stale_after': 5 * 60,   # running jobs without a heartbeat for this long are assumed lost
+}
+HEARTBEAT_INTERVAL = 30
+_executor = None
+_workers = 2
+_lock = threading.RLock()
+_last_cleanup = 0.0
+
+
+def configure(directory=None, workers=2, ttl=24 * 3600):
+    global _workers
+    with _lock:
+        if directory:
+            _settings['directory'] = directory
+        _settings['ttl'] = ttl
+        _workers = workers
+    os.makedirs(_settings['directory'], exist_ok=True)
+
+
+def _get_executor():
+    """Starts the render pool on first use ('spawn', like the chart renderer)."""
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=_workers, mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+
+def _drop_executor(executor):
+    """Forgets a pool a crashed worker broke, so the next export starts a new one."""
+    global _executor
+    with _lock:
+        if _executor is executor:
+            _executor = None
+
+
+def _submit(job, user_fields):
+    """Hands the job to the render pool, replacing the pool once if it is broken. Returns (pool, future)."""
+    for attempt in range(2):
+        executor = _get_executor()
+        try:
+            return executor, executor.submit(_render_job, _settings['directory'], dict(job), user_fields)
+        except BrokenProcessPool:
+            _drop_executor(executor)
+            if attempt:
+                raise
+
+
+def _job_finished(future, executor, job):
+    """Runs in the queuing process: a job whose worker never reported back is marked failed."""
+    error = future.exception()
+    if error is None:
+        return
+    if isinstance(error, BrokenProcessPool):
+        _drop_executor(executor)
+    print(f"Export job {job['id']} was lost: {error}")
+    job.update(status='failed', error='Export worker crashed', finished_at=time.time())
+    _write_status(_settings['directory'], job)
+
+
+def _owner_alive(pid):
+    """Whether the process that queued a job still runs. Only checkable on POSIX; elsewhere assume so."""
+    if not pid or pid == os.getpid() or os.name != 'posix':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True   # exists, but belongs to another user
+    return True
+
+
+def _status_path(job_id):
+    return os.path.join(_settings['directory'], f"{job_id}.json")
+
+
+def _artifact_path(job_id, job_type):
+    return os.path.join(_settings['directory'], f"{job_id}.{JOB_TYPES[job_type][0]}")
+
+
+def _write_status(directory, job):
+    """Atomically replaces a job's status file."""
+    path = os.path.join(directory, f"{job['id']}.json")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(job, f)
+    os.replace(tmp_path, path)
+
+
+def data_fingerprint(user_id, start_day, end_day):
+    """
+    A cheap summary of a user's logs in the range. Rows are only ever inserted
+    or deleted, so count, max id and id sum per table change whenever the data
+    an export would contain changes. Answered from the (user_id, date) indexes.
+    """
+    start, end = day_range(start_day, end_day)
+    parts = []
+    for table in ('meal_logs', 'workout_logs', 'weight_logs'):
+        row = db.execute_query(
+            f"""SELECT COUNT(*) AS n, COALESCE(MAX(id), 0) AS max_id, COALESCE(SUM(id), 0) AS id_sum
+                FROM {table} WHERE user_id = %s AND date >= %s AND date < %s""",
+            (user_id, start, end),
+            fetch_one=True
+        )
+        parts.append(f"{row['n']}:{row['max_id']}:{row['id_sum']}")
+    return '|'.join(parts)
+
+
+def _job_id(user, job_type, start_day, end_day):
+    profile = [user.name, user.age, user.gender, user.height, user.weight, user.goal_weight, user.daily_calories]
+    payload = json.dumps(
+        [user.id, job_type, start_day.isoformat(), end_day.isoformat(),
+         data_fingerprint(user.id, start_day, end_day), profile],
+        default=str, separators=(',', ':')
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def _heartbeat(path, stop):
+    """Touches the status file until `stop` is set, so pollers can tell the worker is alive."""
+    while not stop.wait(HEARTBEAT_INTERVAL):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+
+def _render_job(directory, job, user_fields):
+    """Runs in a worker process: renders the report, then marks the job done or failed."""
+    # Imported here so the web process never pays for xhtml2pdf/openpyxl
+    from export_utils import generate_pdf_report, generate_excel_report
+    from reporting import fetch_report_rows, stream_report_rows
+    from rollups import get_daily_stats
+
+    job.update(status='running', started_at=time.time())
+    _write_status(directory, job)
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(os.path.join(directory, f"{job['id']}.json"), stop), daemon=True).start()
+    user = SimpleNamespace(**user_fields)
+    start_day, end_day = date.fromisoformat(job['start']), date.fromisoformat(job['end'])
+    artifact = os.path.join(directory, f"{job['id']}.{JOB_TYPES[job['type']][0]}")
+    try:
+        daily_stats = get_daily_stats(user.id, start_day, end_day)
+        if job['type'] == 'pdf':
+            rows = fetch_report_rows(user.id, start_day, end_day)
+            meals, workouts, weights = rows['meals'], rows['workouts'], rows['weights']
+            report = generate_pdf_report(user, meals, workouts, weights, daily_stats)
+        else:
+            meals, workouts, weights = stream_report_rows(user.id, start_day, end_day)
+            report = generate_excel_report(user, meals, workouts, weights, daily_stats)
+        tmp_path = f"{artifact}.tmp"
+        with report, open(tmp_path, 'wb') as f:
+            shutil.copyfileobj(report, f)
+        os.replace(tmp_path, artifact)
+        job.update(status='done', finished_at=time.time())
+    except Exception as e:
+        print(f"Export job {job['id']} failed: {e}")
+        job.update(status='failed', error=str(e), finished_at=time.time())
+    finally:
+        stop.set()
+    _write_status(directory, job)
+    return job['status']
+
+
+def get_job(job_id):
+    """Returns the job's status dict, or None if unknown or expired."""
+    if not JOB_ID_PATTERN.match(job_id or ''):
+        return None
+    try:
+        with open(_status_path(job_id)) as f:
+            job = json.load(f)
+        last_seen = os.path.getmtime(_status_path(job_id))
+    except (OSError, ValueError):
+        return None
+    now = time.time()
+    if now - job['created_at'] > _settings['ttl']:
+        return None
+    # A queued job is only waiting for a free worker, however long that takes,
+    # as long as the process whose pool holds it is alive. A running one
+    # touches its status file every HEARTBEAT_INTERVAL seconds.
+    if job['status'] == 'queued' and not _owner_alive(job.get('owner_pid')):
+        job.update(status='failed', error='Export was lost')
+    elif job['status'] == 'running' and now - last_seen > _settings['stale_after']:
+        # The worker died without reporting back
+        job.update(status='failed', error='Export timed out')
+    if job['status'] == 'done' and not os.path.exists(_artifact_path(job_id, job['type'])):
+        return None
+    return job
+
+
+def get_artifact(job_id):
+    """Returns (path, download_name, mimetype) for a finished job, or None."""
+    job = get_job(job_id)
+    if not job or job['status'] != 'done':
+        return None
+    extension, mimetype = JOB_TYPES[job['type']]
+    download_name = f"fitness_{job['type']}_{job['start'].replace('-', '')}_{job['end'].replace('-', '')}.{extension}"
+    return _artifact_path(job_id, job['type']), download_name, mimetype
+
+
+def enqueue(user, job_type, start_day, end_day):
+    """
+    Queues a report export, or returns the existing job if the same report
+    (same user, type, range and unchanged data) is queued, running or done.
+    """
+    os.makedirs(_settings['directory'], exist_ok=True)
+    cleanup_expired()
+    job_id = _job_id(user, job_type, start_day, end_day)
+    with _lock:
+        job = get_job(job_id)
+        if job and job['status'] != 'failed':
+            return job
+        job = {
+            'id': job_id,
+            'user_id': user.id,
+            'type': job_type,
+            'start': start_day.isoformat(),
+            'end': end_day.isoformat(),
+            'status': 'queued',
+            'created_at': time.time(),
+            'owner_pid': os.getpid(),
+            'error': None,
+        }
+        _write_status(_settings['directory'], job)
+        user_fields = {key: getattr(user, key) for key in
+                       ('id', 'name', 'age', 'gender', 'height', 'weight', 'goal_weight', 'daily_calories')}
+        try:
+            executor, future = _submit(job, user_fields)
+        except Exception as e:
+            job.update(status='failed', error=f"Could not start the export: {e}", finished_at=time.time())
+            _write_status(_settings['directory'], job)
+            raise
+        future.add_done_callback(lambda f: _job_finished(f, executor, dict(job)))
+    return job
+
+
+def cleanup_expired(min_interval=60):
+    """Deletes artifacts and status files older than the TTL (at most once a minute)."""
+    global _last_cleanup
+    now = time.time()
+    if now - _last_cleanup < min_interval:
+        return 0
+    _last_cleanup = now
+    removed = 0
+    directory = _settings['directory']
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if now - os.path.getmtime(path) > _settings['ttl']:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
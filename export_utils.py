@@ -1,9 +1,74 @@
-from io import BytesIO
-from xhtml2pdf import pisa
-from openpyxl import Workbook
-from datetime import datetime
+from io import BytesIO, StringIO
+from datetime import date, datetime
+from decimal import Decimal
+import csv
+import json
+import tempfile
 
-def generate_pdf_report(user, meals, workouts, weights):
+from reporting import EXPORT_TABLES
+
+# xhtml2pdf and openpyxl are heavy imports that most requests never need,
+# so they are loaded inside the report functions on first use.
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def iter_csv(kind, rows, flush_every=500):
+    """
+    Formats rows as CSV. The header is yielded on its own right away, so the
+    download starts before the first row is read; rows follow in chunks of
+    `flush_every`.
+    """
+    columns = EXPORT_TABLES[kind][1]
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    pending = 0
+    for row in rows:
+        writer.writerow([_plain(row[column]) for column in columns])
+        pending += 1
+        if pending >= flush_every:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue()
+
+
+def iter_ndjson(kind, rows, flush_every=500):
+    """
+    Formats rows as newline-delimited JSON objects. The first row is yielded
+    on its own so the download starts at once; the rest follow in chunks.
+    """
+    columns = EXPORT_TABLES[kind][1]
+    lines = []
+    first = True
+    for row in rows:
+        lines.append(json.dumps({column: _plain(row[column]) for column in columns}))
+        if first or len(lines) >= flush_every:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+            first = False
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+BULK_FORMATS = {
+    'csv': (iter_csv, 'text/csv'),
+    'ndjson': (iter_ndjson, 'application/x-ndjson'),
+}
+
+def generate_pdf_report(user, meals, workouts, weights, daily_stats=None):
     # Create HTML content
     html = f"""
     <html>
@@ -33,6 +98,33 @@ def generate_pdf_report(user, meals, workouts, weights):
             <p><strong>Daily Calorie Target:</strong> {user.daily_calories}</p>
         </div>
         
+        <div class="section">
+            <h2>Daily Summary</h2>
+            <table>
+                <tr>
+                    <th>Date</th>
+                    <th>Calories In</th>
+                    <th>Protein (g)</th>
+                    <th>Carbs (g)</th>
+                    <th>Fat (g)</th>
+                    <th>Calories Burned</th>
+                    <th>Workout (min)</th>
+                </tr>
+                {''.join([
+                    f"<tr>"
+                    f"<td>{day['stat_date'].strftime('%Y-%m-%d')}</td>"
+                    f"<td>{day['calories_in']:.0f}</td>"
+                    f"<td>{day['protein']:.0f}</td>"
+                    f"<td>{day['carbs']:.0f}</td>"
+                    f"<td>{day['fat']:.0f}</td>"
+                    f"<td>{day['calories_burned']:.0f}</td>"
+                    f"<td>{day['workout_minutes']}</td>"
+                    f"</tr>"
+                    for day in daily_stats or []
+                ])}
+            </table>
+        </div>
+        
         <div class="section">
             <h2>Meal Logs</h2>
             <table>
@@ -47,13 +139,13 @@ def generate_pdf_report(user, meals, workouts, weights):
                 </tr>
                 {''.join([
                     f"<tr>"
-                    f"<td>{meal.date.strftime('%Y-%m-%d')}</td>"
-                    f"<td>{meal.name}</td>"
-                    f"<td>{meal.calories}</td>"
-                    f"<td>{meal.protein}</td>"
-                    f"<td>{meal.carbs}</td>"
-                    f"<td>{meal.fat}</td>"
-                    f"<td>{meal.notes}</td>"
+                    f"<td>{meal['date'].strftime('%Y-%m-%d')}</td>"
+                    f"<td>{meal['name']}</td>"
+                    f"<td>{meal['calories']}</td>"
+                    f"<td>{meal['protein']}</td>"
+                    f"<td>{meal['carbs']}</td>"
+                    f"<td>{meal['fat']}</td>"
+                    f"<td>{meal['notes']}</td>"
                     f"</tr>"
                     for meal in meals
                 ])}
@@ -72,11 +164,11 @@ def generate_pdf_report(user, meals, workouts, weights):
                 </tr>
                 {''.join([
                     f"<tr>"
-                    f"<td>{workout.date.strftime('%Y-%m-%d')}</td>"
-                    f"<td>{workout.type}</td>"
-                    f"<td>{workout.duration}</td>"
-                    f"<td>{workout.calories_burned}</td>"
-                    f"<td>{workout.notes}</td>"
+                    f"<td>{workout['date'].strftime('%Y-%m-%d')}</td>"
+                    f"<td>{workout['type']}</td>"
+                    f"<td>{workout['duration']}</td>"
+                    f"<td>{workout['calories_burned']}</td>"
+                    f"<td>{workout['notes']}</td>"
                     f"</tr>"
                     for workout in workouts
                 ])}
@@ -93,9 +185,9 @@ def generate_pdf_report(user, meals, workouts, weights):
                 </tr>
                 {''.join([
                     f"<tr>"
-                    f"<td>{weight.date.strftime('%Y-%m-%d')}</td>"
-                    f"<td>{weight.weight}</td>"
-                    f"<td>{weight.notes}</td>"
+                    f"<td>{weight['date'].strftime('%Y-%m-%d')}</td>"
+                    f"<td>{weight['weight']}</td>"
+                    f"<td>{weight['notes']}</td>"
                     f"</tr>"
                     for weight in weights
                 ])}
@@ -106,18 +198,24 @@ def generate_pdf_report(user, meals, workouts, weights):
     """
     
     # Create PDF
+    from xhtml2pdf import pisa
     pdf = BytesIO()
     pisa.CreatePDF(html, dest=pdf)
     pdf.seek(0)
     return pdf
 
-def generate_excel_report(user, meals, workouts, weights):
-    # Create a new workbook
-    wb = Workbook()
+def generate_excel_report(user, meals, workouts, weights, daily_stats=None):
+    """
+    Builds the workbook in openpyxl's write-only mode and saves it to an
+    anonymous temp file, so rows (which may be generators from
+    stream_report_rows) go straight to disk and memory stays flat however long
+    the date range is. Returns the open temp file, positioned at the start.
+    """
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
     
     # User Profile Sheet
-    ws_profile = wb.active
-    ws_profile.title = "Profile"
+    ws_profile = wb.create_sheet("Profile")
     ws_profile.append(["User Profile"])
     ws_profile.append(["Name", user.name])
     ws_profile.append(["Age", user.age])
@@ -127,18 +225,32 @@ def generate_excel_report(user, meals, workouts, weights):
     ws_profile.append(["Goal Weight (kg)", user.goal_weight])
     ws_profile.append(["Daily Calorie Target", user.daily_calories])
     
+    # Daily Summary Sheet (from the daily_user_stats rollup)
+    ws_summary = wb.create_sheet("Daily Summary")
+    ws_summary.append(["Date", "Calories In", "Protein (g)", "Carbs (g)", "Fat (g)", "Calories Burned", "Workout (min)"])
+    for day in daily_stats or []:
+        ws_summary.append([
+            day['stat_date'].strftime('%Y-%m-%d'),
+            day['calories_in'],
+            day['protein'],
+            day['carbs'],
+            day['fat'],
+            day['calories_burned'],
+            day['workout_minutes']
+        ])
+    
     # Meals Sheet
     ws_meals = wb.create_sheet("Meals")
     ws_meals.append(["Date", "Meal", "Calories", "Protein (g)", "Carbs (g)", "Fat (g)", "Notes"])
     for meal in meals:
         ws_meals.append([
-            meal.date.strftime('%Y-%m-%d'),
-            meal.name,
-            meal.calories,
-            meal.protein,
-            meal.carbs,
-            meal.fat,
-            meal.notes
+            meal['date'].strftime('%Y-%m-%d'),
+            meal['name'],
+            meal['calories'],
+            meal['protein'],
+            meal['carbs'],
+            meal['fat'],
+            meal['notes']
         ])
     
     # Workouts Sheet
@@ -146,11 +258,11 @@ def generate_excel_report(user, meals, workouts, weights):
     ws_workouts.append(["Date", "Type", "Duration (min)", "Calories Burned", "Notes"])
     for workout in workouts:
         ws_workouts.append([
-            workout.date.strftime('%Y-%m-%d'),
-            workout.type,
-            workout.duration,
-            workout.calories_burned,
-            workout.notes
+            workout['date'].strftime('%Y-%m-%d'),
+            workout['type'],
+            workout['duration'],
+            workout['calories_burned'],
+            workout['notes']
         ])
     
     # Weights Sheet
@@ -158,13 +270,13 @@ def generate_excel_report(user, meals, workouts, weights):
     ws_weights.append(["Date", "Weight (kg)", "Notes"])
     for weight in weights:
         ws_weights.append([
-            weight.date.strftime('%Y-%m-%d'),
-            weight.weight,
-            weight.notes
+            weight['date'].strftime('%Y-%m-%d'),
+            weight['weight'],
+            weight['notes']
         ])
     
-    # Save to BytesIO
-    excel_file = BytesIO()
+    # Spool to a temp file (deleted when closed, e.g. after send_file)
+    excel_file = tempfile.TemporaryFile(suffix='.xlsx')
     wb.save(excel_file)
-    excel_data.seek(0)
-    return excel_data
\ No newline at end of file
+    excel_file.seek(0)
+    return excel_file
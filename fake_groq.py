@@ -0,0 +1,159 @@
+"""
+Local stand-in for the Groq chat-completions API, for load tests and benchmarks
+that should not spend real quota.
+
+    python fake_groq.py --port 8099 --latency 400 --jitter 150 --error-rate 0.05
+    GROQ_BASE_URL=http://localhost:8099 flask --app app run
+
+Replies are canned per prompt type (meal/workout plans in the
+`Type:Name:Calories;...` format, nutrition and workout JSON, quotes, chat) and
+`stream=True` is answered with server-sent chunks like the real API. Latency and
+error injection can be changed while it runs via POST /_control with a JSON body
+using the same keys as the command line options.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+
+from flask import Flask, Response, jsonify, request
+
+app = Flask(__name__)
+
+settings = {
+    'latency': 300.0,        # mean response time, ms
+    'jitter': 100.0,         # +/- ms, uniform
+    'error_rate': 0.0,       # fraction of requests that fail
+    'error_status': 503,     # status used for injected errors
+    'chunk_delay': 30.0,     # ms between streamed chunks
+}
+_counts = {'requests': 0, 'errors': 0, 'streams': 0}
+_lock = threading.Lock()
+
+CANNED = [
+    # (substring of the system prompt, replies)
+    ('diet planning', [
+        "Breakfast:Oatmeal with Berries:350;Lunch:Grilled Chicken Salad:450;Dinner:Salmon with Quinoa:550",
+        "Breakfast:Greek Yogurt Parfait:300;Lunch:Turkey Wrap:500;Snack:Apple with Peanut Butter:200;Dinner:Tofu Stir Fry:500",
+    ]),
+    ('personal trainer', [
+        "Cardio:Brisk Walking:250;Strength:Bodyweight Squats:100;Flexibility:Gentle Stretching:50",
+        "Cardio:Cycling:300;Strength:Push-ups:80;Core:Plank Holds:60",
+    ]),
+    ('"calories", "protein"', [
+        '{"calories": 260, "protein": 13.5, "carbs": 28.0, "fat": 11.2}',
+        '{"calories": 410, "protein": 30.0, "carbs": 35.5, "fat": 14.0}',
+    ]),
+    ('calories_burned', ['{"calories_burned": 300}', '{"calories_burned": 180}']),
+    ('motivational coach', ["Strength grows in the moments you think you can't go on but keep going anyway."]),
+    ('weekly summary', ["Great consistency this week! Keep your protein up and add one more cardio session next week."]),
+]
+CHAT_REPLY = ("That's a great question! A balanced approach works best: keep meals built around lean protein "
+              "and vegetables, stay hydrated, and aim for at least 150 minutes of activity each week.")
+
+
+def _reply_for(messages):
+    system = next((m.get('content', '') for m in messages if m.get('role') == 'system'), '')
+    for marker, replies in CANNED:
+        if marker in system:
+            return random.choice(replies)
+    return CHAT_REPLY
+
+
+def _sleep_latency():
+    delay = settings['latency'] + random.uniform(-settings['jitter'], settings['jitter'])
+    time.sleep(max(0.0, delay) / 1000.0)
+
+
+def _tokens(text):
+    return max(1, len(text) // 4)
+
+
+@app.route('/openai/v1/chat/completions', methods=['POST'])
+@app.route('/v1/chat/completions', methods=['POST'])
+def chat_completions():
+    body = request.get_json(force=True) or {}
+    messages = body.get('messages', [])
+    model = body.get('model', 'llama3-8b-8192')
+    with _lock:
+        _counts['requests'] += 1
+
+    _sleep_latency()
+    if random.random() < settings['error_rate']:
+        with _lock:
+            _counts['errors'] += 1
+        status = int(settings['error_status'])
+        return jsonify({'error': {'message': 'Injected failure from fake_groq', 'type': 'fake_error',
+                                  'code': status}}), status
+
+    content = _reply_for(messages)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    created = int(time.time())
+    prompt_tokens = sum(_tokens(m.get('content', '')) for m in messages)
+
+    if body.get('stream'):
+        with _lock:
+            _counts['streams'] += 1
+
+        def generate():
+            words = content.split(' ')
+            for i, word in enumerate(words):
+                chunk = {
+                    'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                    'choices': [{'index': 0, 'delta': {'content': word if i == 0 else ' ' + word},
+                                 'finish_reason': None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                time.sleep(settings['chunk_delay'] / 1000.0)
+            done = {
+                'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}],
+            }
+            yield f"data: {json.dumps(done)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return Response(generate(), mimetype='text/event-stream')
+
+    completion_tokens = _tokens(content)
+    return jsonify({
+        'id': completion_id,
+        'object': 'chat.completion',
+        'created': created,
+        'model': model,
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+        'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                  'total_tokens': prompt_tokens + completion_tokens},
+    })
+
+
+@app.route('/_control', methods=['GET', 'POST'])
+def control():
+    """GET returns the current settings and counters; POST updates settings."""
+    if request.method == 'POST':
+        updates = request.get_json(force=True) or {}
+        for key, value in updates.items():
+            if key in settings:
+                settings[key] = float(value)
+    with _lock:
+        return jsonify({'settings': settings, 'counts': dict(_counts)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Groq chat-completions server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=settings['latency'], help="mean latency in ms")
+    parser.add_argument('--jitter', type=float, default=settings['jitter'], help="+/- latency jitter in ms")
+    parser.add_argument('--error-rate', type=float, default=settings['error_rate'], help="fraction of failed requests")
+    parser.add_argument('--error-status', type=int, default=settings['error_status'], help="HTTP status for failures")
+    parser.add_argument('--chunk-delay', type=float, default=settings['chunk_delay'], help="ms between stream chunks")
+    args = parser.parse_args()
+    settings.update(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                    error_status=args.error_status, chunk_delay=args.chunk_delay)
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
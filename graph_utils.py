@@ -1,14 +1,22 @@
-import matplotlib
+import io
 
+_plt = None
 
-matplotlib.use('Agg')
 
-import matplotlib.pyplot as plt
-import io
-import base64
+def _pyplot():
+    """Imports matplotlib on first use; it is only needed in chart render workers."""
+    global _plt
+    if _plt is None:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        _plt = plt
+    return _plt
+
 
-def create_plot(dates, data, title, label, color):
-    """Creates a plot and returns it as a base64 encoded image string."""
+def render_plot_png(dates, data, title, label, color):
+    """Creates a plot and returns the raw PNG bytes."""
+    plt = _pyplot()
     plt.style.use('dark_background')
     fig, ax = plt.subplots(figsize=(8, 4))
 
@@ -31,7 +39,4 @@ def create_plot(dates, data, title, label, color):
     buf = io.BytesIO()
     fig.savefig(buf, format='png', bbox_inches='tight')
     plt.close(fig)
-    buf.seek(0)
-    
-    image_base64 = base64.b64encode(buf.read()).decode('utf-8')
-    return f"data:image/png;base64,{image_base64}"
\ No newline at end of file
+    return buf.getvalue()
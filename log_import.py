@@ -0,0 +1,134 @@
+import csv
+from datetime import datetime, timezone
+
+from rollups import insert_logs_batch
+
+# Validation for batched meal/workout logs, shared by the JSON batch API and
+# CSV imports so both end up in rollups.insert_logs_batch. CSV columns match
+# the bulk export (/export/data/<kind>.csv), so exported files re-import as-is.
+
+BATCH_MAX_ITEMS = 500
+CSV_BATCH_SIZE = 1000
+
+
+def _number(item, field, required=False):
+    value = item.get(field)
+    if value in (None, ''):
+        if required:
+            raise ValueError(f"{field} is required")
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be a number")
+
+
+def _date(item):
+    value = item.get('date')
+    if value in (None, ''):
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        raise ValueError("date must be ISO 8601, e.g. 2024-05-01 or 2024-05-01T08:30:00")
+    # Log dates are stored as naive UTC; the connector would drop an offset and keep the local time
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _text(item, field, required=False):
+    value = str(item.get(field) or '').strip()
+    if required and not value:
+        raise ValueError(f"{field} is required")
+    return value or None
+
+
+def parse_meal(item):
+    return {
+        'name': _text(item, 'name', required=True),
+        'calories': _number(item, 'calories', required=True),
+        'protein': _number(item, 'protein'),
+        'carbs': _number(item, 'carbs'),
+        'fat': _number(item, 'fat'),
+        'notes': _text(item, 'notes'),
+        'date': _date(item),
+    }
+
+
+def parse_workout(item):
+    duration = _number(item, 'duration')
+    return {
+        'type': _text(item, 'type', required=True),
+        'duration': int(duration) if duration is not None else None,
+        'calories_burned': _number(item, 'calories_burned'),
+        'notes': _text(item, 'notes'),
+        'date': _date(item),
+    }
+
+
+def parse_weight(item):
+    return {
+        'weight': _number(item, 'weight', required=True),
+        'notes': _text(item, 'notes'),
+        'date': _date(item),
+    }
+
+
+def parse_batch(items):
+    """
+    Validates a list of {'type': 'meal'|'workout', ...} items.
+    Returns (meals, workouts); raises ValueError naming the first bad item.
+    """
+    if not isinstance(items, list) or not items:
+        raise ValueError("items must be a non-empty list")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise ValueError(f"at most {BATCH_MAX_ITEMS} items per batch")
+    meals, workouts = [], []
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError("must be an object")
+            if item.get('type') == 'meal':
+                meals.append(parse_meal(item))
+            elif item.get('type') == 'workout':
+                # Batch items name the exercise `name` and may send `calories`, like the dashboard does
+                workouts.append(parse_workout(dict(
+                    item, type=item.get('name'),
+                    calories_burned=item.get('calories_burned', item.get('calories'))
+                )))
+            else:
+                raise ValueError("type must be 'meal' or 'workout'")
+        except ValueError as e:
+            raise ValueError(f"item {index}: {e}")
+    return meals, workouts
+
+
+def import_csv(user_id, kind, text_stream, batch_size=CSV_BATCH_SIZE):
+    """
+    Imports a meals or workouts CSV (header row required) in transactions of
+    `batch_size` rows. Rows are validated batch by batch, so a bad row stops
+    the import with the earlier batches already committed.
+    Returns the number of rows imported.
+    """
+    parse = {'meals': parse_meal, 'workouts': parse_workout}[kind]
+    reader = csv.DictReader(text_stream)
+    imported = 0
+    batch = []
+    for row in reader:
+        try:
+            batch.append(parse(row))
+        except ValueError as e:
+            raise ValueError(f"line {reader.line_num}: {e} ({imported} rows imported before it)")
+        if len(batch) >= batch_size:
+            imported += _write(user_id, kind, batch)
+            batch = []
+    if batch:
+        imported += _write(user_id, kind, batch)
+    return imported
+
+
+def _write(user_id, kind, batch):
+    if kind == 'meals':
+        return insert_logs_batch(user_id, meals=batch)[0]
+    return insert_logs_batch(user_id, workouts=batch)[1]
@@ -0,0 +1,220 @@
+import re
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime, timedelta
+
+from cache import TTLCache, SingleFlight
+from config import Config
+from database import db
+from ai_integration import get_nutrition_info, get_workout_calories
+
+NUTRITION_FIELDS = ('calories', 'protein', 'carbs', 'fat')
+
+# In-process LRU in front of the shared nutrition_cache table
+_nutrition_memory = TTLCache(maxsize=Config.NUTRITION_CACHE_SIZE, ttl=Config.NUTRITION_MEMORY_TTL)
+_nutrition_flight = SingleFlight()
+
+
+def normalize_query(text):
+    """'  2 Eggs!! ' -> '2 eggs'. Used as the cache key for free-text lookups."""
+    text = (text or '').lower()
+    text = re.sub(r"[^\w\s.,/%-]", ' ', text)
+    text = re.sub(r"\s+", ' ', text).strip(' .,')
+    return text[:255]
+
+
+def _valid_nutrition(data):
+    try:
+        return bool(data) and all(float(data[field]) >= 0 for field in NUTRITION_FIELDS)
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+def _load_shared(key):
+    row = db.execute_query(
+        """SELECT calories, protein, carbs, fat FROM nutrition_cache
+           WHERE query_key = %s AND (expires_at IS NULL OR expires_at > %s)""",
+        (key, datetime.utcnow()),
+        fetch_one=True
+    )
+    return {field: float(row[field]) for field in NUTRITION_FIELDS} if row else None
+
+
+def _store_shared(key, data, source, expires_at):
+    db.execute_query(
+        """INSERT INTO nutrition_cache (query_key, calories, protein, carbs, fat, source, updated_at, expires_at)
+           VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+           ON DUPLICATE KEY UPDATE
+               calories = VALUES(calories), protein = VALUES(protein), carbs = VALUES(carbs),
+               fat = VALUES(fat), source = VALUES(source), updated_at = VALUES(updated_at),
+               expires_at = VALUES(expires_at)""",
+        (key, *(float(data[field]) for field in NUTRITION_FIELDS), source, datetime.utcnow(), expires_at),
+        commit=True
+    )
+
+
+def _fetch_nutrition(key, food_name):
+    """Cache miss path: shared table first, then the LLM. Runs once per key at a time."""
+    data = _load_shared(key)
+    if data is None:
+        data = get_nutrition_info(food_name)
+        if not _valid_nutrition(data):
+            return {}
+        data = {field: float(data[field]) for field in NUTRITION_FIELDS}
+        # Manual overrides never expire and must not be replaced by AI answers
+        db.execute_query(
+            """INSERT INTO nutrition_cache (query_key, calories, protein, carbs, fat, source, updated_at, expires_at)
+               VALUES (%s, %s, %s, %s, %s, 'ai', %s, %s)
+               ON DUPLICATE KEY UPDATE
+                   calories = IF(source = 'override', calories, VALUES(calories)),
+                   protein = IF(source = 'override', protein, VALUES(protein)),
+                   carbs = IF(source = 'override', carbs, VALUES(carbs)),
+                   fat = IF(source = 'override', fat, VALUES(fat)),
+                   updated_at = IF(source = 'override', updated_at, VALUES(updated_at)),
+                   expires_at = IF(source = 'override', expires_at, VALUES(expires_at))""",
+            (key, *(data[field] for field in NUTRITION_FIELDS), datetime.utcnow(),
+             datetime.utcnow() + timedelta(days=Config.NUTRITION_CACHE_TTL_DAYS)),
+            commit=True
+        )
+    _nutrition_memory.set(key, data)
+    return data
+
+
+def cached_nutrition_info(food_name):
+    """
+    get_nutrition_info() behind an in-process LRU, the shared nutrition_cache
+    table and single-flight deduplication of concurrent identical lookups.
+    """
+    key = normalize_query(food_name)
+    if not key:
+        return {}
+    data = _nutrition_memory.get(key)
+    if data is None:
+        data = _nutrition_flight.do(key, _fetch_nutrition, key, food_name)
+    return dict(data)
+
+
+def set_nutrition_override(food_name, calories, protein, carbs, fat):
+    """Stores a manual correction that takes precedence over AI results and never expires."""
+    key = normalize_query(food_name)
+    data = {'calories': calories, 'protein': protein, 'carbs': carbs, 'fat': fat}
+    _store_shared(key, data, 'override', None)
+    _nutrition_memory.set(key, {field: float(data[field]) for field in NUTRITION_FIELDS})
+    return key
+
+
+# --- Workout calorie estimates ---
+
+# Approximate MET values (Compendium of Physical Activities) used when the
+# LLM is slow or unavailable. Each term matches whole words only (with the
+# listed inflections), so "crunches" is not a run. Checked in order, so more
+# specific terms first.
+MET_TABLE = [
+    ('sprint(?:s|ing)?', 12.0), ('jump(?:ing)? rope', 11.0), ('skipping', 11.0), ('run(?:s|ning|ner)?', 9.8),
+    ('jog(?:s|ging)?', 7.0), ('hiit', 8.0), ('crossfit', 8.0), ('swim(?:s|ming)?', 7.0), ('cycl(?:e|es|ing)', 7.5),
+    ('bik(?:e|es|ing)', 7.5), ('spin(?:ning)?', 8.5), ('row(?:s|ing|er)?', 7.0), ('elliptical', 5.0),
+    ('hik(?:e|es|ing)', 6.0), ('stair(?:s|master)?', 8.0), ('danc(?:e|es|ing)', 5.5), ('boxing', 7.8),
+    ('football', 7.0), ('soccer', 7.0), ('basketball', 6.5), ('tennis', 7.3), ('badminton', 5.5),
+    ('cricket', 4.8), ('weight(?:s|lifting)?', 5.0), ('lift(?:s|ing)?', 5.0), ('strength', 5.0),
+    ('squat(?:s|ting)?', 5.0), ('push[- ]?ups?', 3.8), ('pilates', 3.0), ('yoga', 2.5),
+    ('stretch(?:es|ing)?', 2.3), ('walk(?:s|ing)?', 3.5),
+]
+_MET_PATTERNS = [(re.compile(rf"\b(?:{term})\b"), value) for term, value in MET_TABLE]
+DEFAULT_MET = 4.0
+DEFAULT_BODY_WEIGHT = 70.0
+DEFAULT_DURATION_MIN = 30.0
+
+_workout_memory = TTLCache(maxsize=Config.WORKOUT_CACHE_SIZE, ttl=Config.WORKOUT_CACHE_TTL)
+_workout_flight = SingleFlight()
+_workout_executor = None
+
+
+def _weight_bucket(body_weight):
+    """Groups body weights into 10 kg buckets so similar users share cache entries."""
+    try:
+        return int(float(body_weight) // 10 * 10) if body_weight else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_duration_minutes(description):
+    text = description.lower()
+    hours = re.search(r"(\d+(?:\.\d+)?)\s*(?:h|hr|hrs|hour|hours)\b", text)
+    minutes = re.search(r"(\d+(?:\.\d+)?)\s*(?:m|min|mins|minute|minutes)\b", text)
+    total = 0.0
+    if hours:
+        total += float(hours.group(1)) * 60
+    if minutes:
+        total += float(minutes.group(1))
+    return total or DEFAULT_DURATION_MIN
+
+
+def estimate_calories_met(description, body_weight=None):
+    """Deterministic estimate: MET x body weight (kg) x hours."""
+    text = description.lower()
+    met = next((value for pattern, value in _MET_PATTERNS if pattern.search(text)), DEFAULT_MET)
+    weight = float(body_weight) if body_weight else DEFAULT_BODY_WEIGHT
+    hours = _parse_duration_minutes(description) / 60
+    return {'calories_burned': int(round(met * weight * hours))}
+
+
+def _get_workout_executor():
+    global _workout_executor
+    if _workout_executor is None:
+        _workout_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='workout-ai')
+    return _workout_executor
+
+
+def _fetch_workout_calories(key, description):
+    """Asks the LLM with a deadline; falls back to the MET table if it is slow or fails."""
+    # Both estimates use the bucketed weight so every caller sharing the key gets the same answer
+    bucket = key[1]
+    future = _get_workout_executor().submit(get_workout_calories, description, bucket)
+
+    def _late_result(f):
+        # An answer that arrives after the deadline still replaces the fallback
+        if not f.cancelled() and f.exception() is None and _valid_workout(f.result()):
+            _workout_memory.set(key, {'calories_burned': int(f.result()['calories_burned']), 'source': 'ai'})
+
+    try:
+        data = future.result(timeout=Config.WORKOUT_AI_TIMEOUT)
+    except FutureTimeout:
+        future.add_done_callback(_late_result)
+        data = None
+
+    if _valid_workout(data):
+        data = {'calories_burned': int(data['calories_burned']), 'source': 'ai'}
+        _workout_memory.set(key, data)
+    else:
+        data = {**estimate_calories_met(description, bucket), 'source': 'met'}
+        # Keep fallbacks briefly so the LLM gets another chance soon
+        _workout_memory.set(key, data, ttl=60)
+    return data
+
+
+def _valid_workout(data):
+    try:
+        return bool(data) and int(data['calories_burned']) >= 0
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+def cached_workout_calories(description, body_weight=None):
+    """
+    get_workout_calories() keyed by the normalized description and body weight
+    bucket, with single-flight deduplication and a MET-table fallback.
+    Returns {'calories_burned': int, 'source': 'ai' | 'met'}.
+    """
+    key = (normalize_query(description), _weight_bucket(body_weight))
+    if not key[0]:
+        return {}
+    data = _workout_memory.get(key)
+    if data is None:
+        data = _workout_flight.do(key, _fetch_workout_calories, key, description)
+    return dict(data)
+
+
+def stats():
+    return {
+        'nutrition': {**_nutrition_memory.stats(), 'shared_flights': _nutrition_flight.shared},
+        'workout_calories': {**_workout_memory.stats(), 'shared_flights': _workout_flight.shared},
+    }
@@ -2,6 +2,8 @@ from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 from database import db  # Your custom MySQL database helper
+from rollups import insert_meal, insert_workout, insert_weight
+from sync_log import next_sync_seq
 
 class User(UserMixin):
     def __init__(self, user_data):
@@ -52,19 +54,20 @@ class User(UserMixin):
         return User(user_data) if user_data else None
 
     def update_profile(self):
-        db.execute_query(
-            """UPDATE users SET 
-               email=%s, name=%s, profile_photo=%s, age=%s, 
-               gender=%s, height=%s, weight=%s, goal_weight=%s,
-               diet_preference=%s, fitness_goal=%s, activity_level=%s,
-               daily_calories=%s, dark_mode=%s
-               WHERE id=%s""",
-            (self.email, self.name, self.profile_photo, self.age,
-             self.gender, self.height, self.weight, self.goal_weight,
-             self.diet_preference, self.fitness_goal, self.activity_level,
-             self.daily_calories, self.dark_mode, self.id),
-            commit=True
-        )
+        with db.get_cursor(commit=True) as cursor:
+            cursor.execute(
+                """UPDATE users SET 
+                   email=%s, name=%s, profile_photo=%s, age=%s, 
+                   gender=%s, height=%s, weight=%s, goal_weight=%s,
+                   diet_preference=%s, fitness_goal=%s, activity_level=%s,
+                   daily_calories=%s, dark_mode=%s
+                   WHERE id=%s""",
+                (self.email, self.name, self.profile_photo, self.age,
+                 self.gender, self.height, self.weight, self.goal_weight,
+                 self.diet_preference, self.fitness_goal, self.activity_level,
+                 self.daily_calories, self.dark_mode, self.id)
+            )
+            next_sync_seq(cursor, self.id, kinds=('profile',))
 
     def check_password(self, password):
         return check_password_hash(self.password, password)
@@ -72,13 +75,7 @@ class User(UserMixin):
 class MealLog:
     @staticmethod
     def create(user_id, name, calories, protein=None, carbs=None, fat=None, notes=None):
-        db.execute_query(
-            """INSERT INTO meal_logs 
-               (user_id, name, calories, protein, carbs, fat, notes)
-               VALUES (%s, %s, %s, %s, %s, %s, %s)""",
-            (user_id, name, calories, protein, carbs, fat, notes),
-            commit=True
-        )
+        insert_meal(user_id, name, calories, protein, carbs, fat, notes)
 
     @staticmethod
     def get_recent(user_id, days=7):
@@ -93,13 +90,7 @@ class MealLog:
 class WorkoutLog:
     @staticmethod
     def create(user_id, workout_type, duration, calories_burned=None, notes=None):
-        db.execute_query(
-            """INSERT INTO workout_logs 
-               (user_id, type, duration, calories_burned, notes)
-               VALUES (%s, %s, %s, %s, %s)""",
-            (user_id, workout_type, duration, calories_burned, notes),
-            commit=True
-        )
+        insert_workout(user_id, workout_type, duration, calories_burned, notes)
 
     @staticmethod
     def get_recent(user_id, days=7):
@@ -114,13 +105,7 @@ class WorkoutLog:
 class WeightLog:
     @staticmethod
     def create(user_id, weight, notes=None):
-        db.execute_query(
-            """INSERT INTO weight_logs 
-               (user_id, weight, notes)
-               VALUES (%s, %s, %s)""",
-            (user_id, weight, notes),
-            commit=True
-        )
+        insert_weight(user_id, weight, notes)
 
     @staticmethod
     def get_history(user_id, days=30):
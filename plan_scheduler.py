@@ -0,0 +1,86 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from database import db
+import plans
+
+
+def get_active_users(since_days=7):
+    """Users with a complete profile who logged something in the last `since_days` days."""
+    return db.execute_query(
+        """SELECT u.* FROM users u
+           WHERE u.age IS NOT NULL AND u.height IS NOT NULL
+             AND u.weight IS NOT NULL AND u.daily_calories IS NOT NULL
+             AND EXISTS (SELECT 1 FROM daily_user_stats s
+                         WHERE s.user_id = u.id AND s.stat_date >= %s)""",
+        (datetime.utcnow().date() - timedelta(days=since_days),),
+        fetch_all=True
+    ) or []
+
+
+def pregenerate_plans(target_date=None, since_days=7):
+    """
+    Generates missing daily_plans rows for every active user for `target_date`
+    (default: tomorrow, UTC). Work is spread over the shared bounded plan
+    executor. Returns (generated, skipped, failed) counts.
+    """
+    target_date = target_date or datetime.utcnow().date() + timedelta(days=1)
+    existing = db.execute_query(
+        "SELECT user_id, plan_type FROM daily_plans WHERE date = %s",
+        (target_date,),
+        fetch_all=True
+    ) or []
+    done = {(row['user_id'], row['plan_type']) for row in existing}
+
+    jobs = []
+    skipped = 0
+    for row in get_active_users(since_days):
+        # The AI helpers only read profile attributes, so a plain namespace stands in for User
+        user = SimpleNamespace(**row)
+        missing = tuple(t for t in plans.PLAN_TYPES if (user.id, t) not in done)
+        skipped += len(plans.PLAN_TYPES) - len(missing)
+        if missing:
+            jobs.extend(plans.generate_plans_async(user, target_date, missing).items())
+
+    generated = failed = 0
+    for plan_type, future in jobs:
+        try:
+            if future.result().get(plan_type):
+                generated += 1
+            else:
+                failed += 1
+        except Exception as e:
+            print(f"Plan pre-generation error: {e}")
+            failed += 1
+    return generated, skipped, failed
+
+
+def _seconds_until(hour):
+    now = datetime.utcnow()
+    run_at = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if run_at <= now:
+        run_at += timedelta(days=1)
+    return (run_at - now).total_seconds()
+
+
+def _scheduler_loop(hour):
+    while True:
+        time.sleep(_seconds_until(hour))
+        try:
+            generated, skipped, failed = pregenerate_plans()
+            print(f"Pre-generated plans: {generated} generated, {skipped} already present, {failed} failed")
+        except Exception as e:
+            print(f"Plan scheduler error: {e}")
+
+
+def start_scheduler(hour):
+    """
+    Runs pregenerate_plans() every day at `hour` (UTC) in a daemon thread.
+    Enable it in exactly one process (PLAN_SCHEDULER_ENABLED), or use
+    `flask pregenerate-plans` from cron instead.
+    """
+    thread = threading.Thread(target=_scheduler_loop, args=(hour,), name='plan-scheduler', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,187 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from database import db
+from ai_integration import generate_ai_content, get_daily_quote, DEFAULT_QUOTE
+
+PLAN_TYPES = ('diet', 'workout')
+
+# Shown while a plan is still being generated; static/js picks it up and polls /api/plan
+PLAN_PLACEHOLDER_HTML = """<li class="plan-item plan-loading" data-plan-pending="{plan_type}"><div class="item-details"><div class="item-name">Generating your {plan_type} plan...</div><div class="item-info">This usually takes a few seconds.</div></div></li>"""
+
+
+def build_plan_html(plan_type, ai_response_str):
+    """Turns the `Type:Name:Calories;...` AI response into the dashboard's <li> items."""
+    html_content = ""
+    if plan_type == 'diet':
+        for item in (ai_response_str or "").split(';'):
+            if ':' in item and len(item.split(':')) == 3:
+                meal_type, food, cals = item.split(':')
+                html_content += f"""<li class="plan-item" data-name="{food}" data-calories="{float(cals)}" data-type="meal"><input type="checkbox"><div class="item-details"><div class="item-name">{meal_type}: {food}</div><div class="item-info">{float(cals):.0f} kcal</div></div><div class="item-actions"><button class="edit-btn"><i class="fas fa-pencil-alt"></i></button></div></li>"""
+
+    elif plan_type == 'workout':
+        for item in (ai_response_str or "").split(';'):
+            if ':' in item and len(item.split(':')) == 3:
+                cat, ex, cals = item.split(':')
+                html_content += f"""<li class="plan-item" data-name="{ex}" data-calories="{float(cals)}" data-type="workout"><input type="checkbox"><div class="item-details"><div class="item-name">{cat}: {ex}</div><div class="item-info">{float(cals):.0f} kcal burned</div></div><div class="item-actions"><button class="edit-btn"><i class="fas fa-pencil-alt"></i></button></div></li>"""
+    return html_content
+
+
+def get_cached_plan(user_id, date, plan_type):
+    query = "SELECT html_content FROM daily_plans WHERE user_id = %s AND date = %s AND plan_type = %s"
+    existing_plan = db.execute_query(query, (user_id, date, plan_type), fetch_one=True)
+    if existing_plan and existing_plan['html_content']:
+        return existing_plan['html_content']
+    return None
+
+
+def save_plan(user_id, date, plan_type, html_content):
+    save_query = """
+        INSERT INTO daily_plans (user_id, date, plan_type, html_content)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE html_content = VALUES(html_content)
+    """
+    db.execute_query(save_query, (user_id, date, plan_type, html_content), commit=True)
+
+
+def generate_plans(user, date, plan_types=PLAN_TYPES):
+    """
+    Generates several plans with their LLM calls running concurrently, so the
+    wait is the slowest call rather than the sum. Returns {plan_type: html}.
+    """
+    try:
+        content = generate_ai_content(user, plan_types)
+    except Exception as e:
+        print(f"CRITICAL ERROR generating AI plans: {e}")
+        return {plan_type: "" for plan_type in plan_types}
+    results = {}
+    for plan_type in plan_types:
+        html_content = build_plan_html(plan_type, content.get(plan_type))
+        if html_content:
+            save_plan(user.id, date, plan_type, html_content)
+        results[plan_type] = html_content
+    return results
+
+
+# --- Background generation ---
+# Both the nightly pre-generation run and the dashboard's "not ready yet"
+# fallback go through one bounded executor (PLAN_WORKERS jobs at a time). The
+# Groq quota itself is enforced by ai_client's rate limiter, which every call
+# goes through and which gives up after the call's deadline instead of letting
+# jobs queue behind it forever. A plan that came back empty is not asked for
+# again by dashboard polls until PLAN_RETRY_AFTER seconds have passed.
+
+PLAN_RETRY_AFTER = 120
+
+_executor = None
+_in_flight = {}
+_failed = {}   # (user_id, date, plan_type) -> when generation last returned nothing
+_lock = threading.Lock()
+_quote = {'date': None, 'text': None}
+_quote_future = None
+
+
+def configure(workers=2):
+    global _executor
+    with _lock:
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='plan-gen')
+
+
+def _generate_missing(user, date, plan_types):
+    # Another worker (or the nightly run) may have finished some while we queued
+    cached = {t: get_cached_plan(user.id, date, t) for t in plan_types}
+    results = {t: html for t, html in cached.items() if html}
+    missing = tuple(t for t in plan_types if t not in results)
+    if missing:
+        results.update(generate_plans(user, date, missing))
+    now = time.monotonic()
+    with _lock:
+        for key in [key for key, failed_at in _failed.items() if now - failed_at >= PLAN_RETRY_AFTER]:
+            del _failed[key]
+        for plan_type in plan_types:
+            if results.get(plan_type):
+                _failed.pop((user.id, date, plan_type), None)
+            else:
+                _failed[(user.id, date, plan_type)] = now
+    return results
+
+
+def _forget_in_flight(key, future):
+    with _lock:
+        if _in_flight.get(key) is future:
+            del _in_flight[key]
+
+
+def generate_plans_async(user, date, plan_types=PLAN_TYPES):
+    """
+    Queues generation of missing plans as one job (their LLM calls run
+    concurrently). A plan already being generated is not queued twice.
+    Returns {plan_type: future}, where each future resolves to {plan_type: html}.
+    """
+    if _executor is None:
+        configure()
+    with _lock:
+        futures = {t: _in_flight[(user.id, date, t)] for t in plan_types if (user.id, date, t) in _in_flight}
+        to_queue = tuple(t for t in plan_types if t not in futures)
+        if to_queue:
+            future = _executor.submit(_generate_missing, user, date, to_queue)
+            for plan_type in to_queue:
+                _in_flight[(user.id, date, plan_type)] = future
+                futures[plan_type] = future
+    # Outside the lock: a job that already finished runs its callback right here
+    if to_queue:
+        for plan_type in to_queue:
+            future.add_done_callback(lambda f, key=(user.id, date, plan_type): _forget_in_flight(key, f))
+    return futures
+
+
+def get_plans_or_placeholders(user, date, plan_types=PLAN_TYPES):
+    """
+    Returns {plan_type: (html, ready)}. Plans that are not cached yet are
+    generated in the background and a placeholder is returned instead; one
+    that just failed to generate is retried after PLAN_RETRY_AFTER.
+    """
+    results = {}
+    missing = []
+    for plan_type in plan_types:
+        html_content = get_cached_plan(user.id, date, plan_type)
+        if html_content:
+            results[plan_type] = (html_content, True)
+        else:
+            missing.append(plan_type)
+            results[plan_type] = (PLAN_PLACEHOLDER_HTML.format(plan_type=plan_type), False)
+    now = time.monotonic()
+    with _lock:
+        missing = [t for t in missing
+                   if (user.id, date, t) not in _failed or now - _failed[(user.id, date, t)] >= PLAN_RETRY_AFTER]
+    if missing:
+        generate_plans_async(user, date, tuple(missing))
+    return results
+
+
+# --- Daily quote ---
+# Everyone gets the same quote of the day. The first dashboard view of the day
+# queues the AI call on the plan executor and shows DEFAULT_QUOTE meanwhile, so
+# no request waits on Groq for it.
+
+def _fetch_quote(date):
+    quote = get_daily_quote()
+    # A failed call returns DEFAULT_QUOTE; leave the day open so a later view retries
+    if quote and quote != DEFAULT_QUOTE:
+        with _lock:
+            _quote.update(date=date, text=quote)
+    return quote
+
+
+def get_daily_quote_or_default(date):
+    """Returns (quote, ready). Until the day's quote is in, queues it and returns DEFAULT_QUOTE."""
+    global _quote_future
+    if _executor is None:
+        configure()
+    with _lock:
+        if _quote['date'] == date:
+            return _quote['text'], True
+        if _quote_future is None or _quote_future.done():
+            _quote_future = _executor.submit(_fetch_quote, date)
+    return DEFAULT_QUOTE, False
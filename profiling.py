@@ -0,0 +1,237 @@
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from flask import request, before_render_template, template_rendered
+
+# --- Request profiling ---
+# Every request gets a RequestProfile that adds up where its wall time went:
+# database queries (reported by Database query listeners), Groq calls, chart
+# building/rendering and Jinja templates; whatever is left is "app" time.
+# Phases are exclusive: a query run while a template renders counts as db,
+# not template. Totals per route are exposed as Prometheus text on /metrics.
+# Figures are per process; with several workers each one reports its own.
+
+PHASES = ('db', 'ai', 'chart', 'template')
+DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = ContextVar('request_profile', default=None)
+_settings = {
+    'server_timing': False,
+    'slow_ms': 1000,
+    'slow_sample': 0.1,
+}
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.queries = 0
+        self._stack = []   # [phase, started] for the phases currently open
+
+    def record(self, phase, seconds):
+        """Adds time spent in `phase` and takes it out of the enclosing phase."""
+        self.phases[phase] += seconds
+        if self._stack:
+            self._stack[-1][1] += seconds
+
+    def enter(self, phase):
+        self._stack.append([phase, time.perf_counter()])
+
+    def exit(self, phase):
+        if self._stack and self._stack[-1][0] == phase:
+            _, started = self._stack.pop()
+            self.record(phase, time.perf_counter() - started)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def current_profile():
+    """The profile of the request being handled on this thread, or None."""
+    return _current.get()
+
+
+@contextmanager
+def phase(name):
+    """Counts the block's wall time towards `name` for the current request (no-op outside one)."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    profile.enter(name)
+    try:
+        yield
+    finally:
+        profile.exit(name)
+
+
+def timed(name):
+    """Decorator form of phase()."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_query(query, params, seconds):
+    """Database query listener: counts the statement towards the current request."""
+    profile = _current.get()
+    if profile is not None:
+        profile.queries += 1
+        profile.record('db', seconds)
+
+
+# --- Per-route totals ---
+
+class _RouteStats:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.phases = dict.fromkeys(PHASES + ('app',), 0.0)
+        self.queries = 0
+        self.errors = 0
+
+
+_routes = defaultdict(_RouteStats)
+_routes_lock = threading.Lock()
+
+
+def _app_seconds(profile, total):
+    return max(0.0, total - sum(profile.phases.values()))
+
+
+def _observe(route, method, status, profile, total):
+    with _routes_lock:
+        stats = _routes[(route, method)]
+        stats.count += 1
+        stats.seconds += total
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if total <= bound:
+                stats.buckets[i] += 1
+        for name, seconds in profile.phases.items():
+            stats.phases[name] += seconds
+        stats.phases['app'] += _app_seconds(profile, total)
+        stats.queries += profile.queries
+        if status >= 500:
+            stats.errors += 1
+
+
+def server_timing(profile, total):
+    """Formats the breakdown as a Server-Timing header value (shown in browser dev tools)."""
+    parts = [f'db;dur={profile.phases["db"] * 1000:.1f};desc="{profile.queries} queries"']
+    parts += [f'{name};dur={profile.phases[name] * 1000:.1f}' for name in PHASES[1:] if profile.phases[name]]
+    parts.append(f'app;dur={_app_seconds(profile, total) * 1000:.1f}')
+    parts.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(parts)
+
+
+def _log_slow(route, profile, total):
+    breakdown = ', '.join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in profile.phases.items() if seconds)
+    print(f"Slow request: {request.method} {request.path} ({route}) took {total * 1000:.0f}ms "
+          f"[{breakdown or 'no phases'}, app {_app_seconds(profile, total) * 1000:.0f}ms, {profile.queries} queries]")
+
+
+def _start_request():
+    _current.set(RequestProfile())
+
+
+def _finish_request(response):
+    profile = _current.get()
+    if profile is None:
+        return response
+    total = profile.elapsed()
+    route = request.endpoint or 'unmatched'
+    _observe(route, request.method, response.status_code, profile, total)
+    if _settings['server_timing']:
+        response.headers['Server-Timing'] = server_timing(profile, total)
+    if total * 1000 >= _settings['slow_ms'] and random.random() < _settings['slow_sample']:
+        _log_slow(route, profile, total)
+    return response
+
+
+def _clear_request(exc=None):
+    _current.set(None)
+
+
+def _template_started(sender, template, context, **extra):
+    profile = _current.get()
+    if profile is not None:
+        profile.enter('template')
+
+
+def _template_finished(sender, template, context, **extra):
+    profile = _current.get()
+    if profile is not None:
+        profile.exit('template')
+
+
+def init_app(app, server_timing=False, slow_ms=1000, slow_sample=0.1):
+    """Installs the request hooks. Register record_query as a Database query listener as well."""
+    _settings.update(server_timing=server_timing, slow_ms=slow_ms, slow_sample=slow_sample)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_clear_request)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+
+
+# --- Prometheus exposition ---
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+
+
+def render_metrics():
+    """All route totals in the Prometheus text format (version 0.0.4)."""
+    with _routes_lock:
+        snapshot = [(key, stats.count, stats.seconds, list(stats.buckets), dict(stats.phases),
+                     stats.queries, stats.errors)
+                    for key, stats in sorted(_routes.items())]
+
+    lines = [
+        '# HELP fittracker_request_duration_seconds Wall time per request.',
+        '# TYPE fittracker_request_duration_seconds histogram',
+    ]
+    for (route, method), count, seconds, buckets, _, _, _ in snapshot:
+        for bound, n in zip(DURATION_BUCKETS, buckets):
+            lines.append(f'fittracker_request_duration_seconds_bucket{{{_labels(route=route, method=method, le=bound)}}} {n}')
+        lines.append(f'fittracker_request_duration_seconds_bucket{{{_labels(route=route, method=method, le="+Inf")}}} {count}')
+        lines.append(f'fittracker_request_duration_seconds_sum{{{_labels(route=route, method=method)}}} {seconds:.6f}')
+        lines.append(f'fittracker_request_duration_seconds_count{{{_labels(route=route, method=method)}}} {count}')
+
+    lines += [
+        '# HELP fittracker_request_phase_seconds_total Request wall time by phase (db, ai, chart, template, app).',
+        '# TYPE fittracker_request_phase_seconds_total counter',
+    ]
+    for (route, method), _, _, _, phases, _, _ in snapshot:
+        for name, seconds in phases.items():
+            lines.append(f'fittracker_request_phase_seconds_total{{{_labels(route=route, method=method, phase=name)}}} {seconds:.6f}')
+
+    lines += [
+        '# HELP fittracker_db_queries_total SQL statements run while handling requests.',
+        '# TYPE fittracker_db_queries_total counter',
+    ]
+    for (route, method), _, _, _, _, queries, _ in snapshot:
+        lines.append(f'fittracker_db_queries_total{{{_labels(route=route, method=method)}}} {queries}')
+
+    lines += [
+        '# HELP fittracker_request_errors_total Requests answered with a 5xx status.',
+        '# TYPE fittracker_request_errors_total counter',
+    ]
+    for (route, method), _, _, _, _, _, errors in snapshot:
+        lines.append(f'fittracker_request_errors_total{{{_labels(route=route, method=method)}}} {errors}')
+    return '\n'.join(lines) + '\n'
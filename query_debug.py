@@ -0,0 +1,87 @@
+from flask import current_app, g, request
+
+from database import db, QueryBudgetExceeded
+
+# --- Per-request query debugging (DB_DEBUG_QUERIES, and always in debug mode) ---
+# Records every statement each request runs (Database.begin_query_log) and,
+# after the view returns, prints the request's queries when it repeated a
+# statement, showed an N+1 pattern or went over its route's budget. Budgets
+# are per endpoint: DEFAULT_BUDGETS for the hot routes, plus or overridden by
+# QUERY_BUDGETS="dashboard=10,log_meal=5". With strict set, or when the app
+# runs in debug mode, going over budget raises QueryBudgetExceeded, which
+# fails the request (and, under app.testing, the test that made it).
+
+# Measured on a first dashboard view of the day (nothing cached, streak
+# initialised), a chart-data poll and a pull-only sync; sync entries add
+# their own allowance through allow_queries()
+DEFAULT_BUDGETS = {
+    'dashboard': 12,
+    'chart_data': 2,
+    'api_sync': 10,
+}
+
+_settings = {
+    'enabled': False,
+    'budgets': dict(DEFAULT_BUDGETS),
+    'strict': False,
+}
+
+
+def parse_budgets(text):
+    """Parses "endpoint=N,endpoint=N" into a dict; raises ValueError on bad entries."""
+    budgets = {}
+    for item in (text or '').split(','):
+        if not item.strip():
+            continue
+        endpoint, _, limit = item.partition('=')
+        try:
+            budgets[endpoint.strip()] = int(limit)
+        except ValueError:
+            raise ValueError(f"QUERY_BUDGETS entry must look like endpoint=N, got {item.strip()!r}")
+    return budgets
+
+
+def allow_queries(count):
+    """Raises this request's budget by `count`, for work that grows with the input (e.g. sync entries)."""
+    g._query_allowance = g.get('_query_allowance', 0) + count
+
+
+def _start_request():
+    if _settings['enabled'] or current_app.debug:
+        g._query_log = db.begin_query_log(f"{request.method} {request.path}")
+
+
+def _finish_request(response):
+    log = g.pop('_query_log', None)
+    if log is None:
+        return response
+    db.end_query_log(log)
+    response.headers['X-Query-Count'] = str(log.count)
+    budget = _settings['budgets'].get(request.endpoint)
+    if budget is not None:
+        budget += g.pop('_query_allowance', 0)
+    over_budget = budget is not None and log.count > budget
+    if over_budget or log.duplicates() or log.n_plus_one():
+        note = f" (budget {budget} for {request.endpoint})" if over_budget else ""
+        print(f"Query debug: {log.report()}{note}")
+    if over_budget and (_settings['strict'] or current_app.debug):
+        raise QueryBudgetExceeded(f"{request.endpoint} ran {log.count} queries, budget {budget}\n{log.report()}")
+    return response
+
+
+def _clear_request(exc=None):
+    # after_request does not run when an exception propagates; stop recording either way
+    log = g.pop('_query_log', None)
+    if log is not None:
+        db.end_query_log(log)
+
+
+def init_app(app, budgets=None, strict=False, enabled=False):
+    """
+    Installs the request hooks. Recording is on when `enabled` (DB_DEBUG_QUERIES)
+    and for every request while app.debug is set; `budgets` add to DEFAULT_BUDGETS.
+    """
+    _settings.update(enabled=enabled, budgets={**DEFAULT_BUDGETS, **(budgets or {})}, strict=strict)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_clear_request)
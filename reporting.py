@@ -0,0 +1,120 @@
+from datetime import timedelta
+
+from database import db, day_range
+
+# Read-side queries for reports (exports, weekly summary). Each report fetches
+# only the columns it shows and gets all of its log series in one round trip;
+# totals are summed in SQL from the daily_user_stats rollup.
+
+REPORT_SECTIONS = ('meals', 'workouts', 'weights')
+
+# The three logs as one UNION ALL in a common shape, ordered by section then date.
+# `label`/`amount` carry the meal name/calories or the workout type/calories burned.
+_REPORT_ROWS = """
+    SELECT 0 AS section, date, name AS label, calories AS amount, protein, carbs, fat,
+           NULL AS duration, NULL AS weight, notes
+    FROM meal_logs WHERE user_id = %s AND date >= %s AND date < %s
+    UNION ALL
+    SELECT 1, date, type, calories_burned, NULL, NULL, NULL, duration, NULL, notes
+    FROM workout_logs WHERE user_id = %s AND date >= %s AND date < %s
+    UNION ALL
+    SELECT 2, date, NULL, NULL, NULL, NULL, NULL, NULL, weight, notes
+    FROM weight_logs WHERE user_id = %s AND date >= %s AND date < %s
+    ORDER BY section, date
+"""
+
+
+def _section_row(section, row):
+    """Maps a UNION row back to the column names the report templates use."""
+    if section == 0:
+        return {'date': row['date'], 'name': row['label'], 'calories': row['amount'], 'protein': row['protein'],
+                'carbs': row['carbs'], 'fat': row['fat'], 'notes': row['notes']}
+    if section == 1:
+        return {'date': row['date'], 'type': row['label'], 'duration': row['duration'],
+                'calories_burned': row['amount'], 'notes': row['notes']}
+    return {'date': row['date'], 'weight': row['weight'], 'notes': row['notes']}
+
+
+def _report_params(user_id, start_day, end_day):
+    start, end = day_range(start_day, end_day)
+    return (user_id, start, end) * 3
+
+
+def fetch_report_rows(user_id, start_day, end_day):
+    """Returns {'meals': [...], 'workouts': [...], 'weights': [...]} from a single query."""
+    rows = db.execute_query(_REPORT_ROWS, _report_params(user_id, start_day, end_day), fetch_all=True) or []
+    sections = {kind: [] for kind in REPORT_SECTIONS}
+    for row in rows:
+        section = int(row['section'])
+        sections[REPORT_SECTIONS[section]].append(_section_row(section, row))
+    return sections
+
+
+def stream_report_rows(user_id, start_day, end_day):
+    """
+    Like fetch_report_rows, but streams the single query and returns three lazy
+    iterators (meals, workouts, weights). They share one cursor, so consume
+    them fully and in that order, as generate_excel_report does.
+    """
+    rows = db.stream_query(_REPORT_ROWS, _report_params(user_id, start_day, end_day))
+    held = []
+
+    def section_rows(section):
+        while True:
+            row = held.pop() if held else next(rows, None)
+            if row is None:
+                return
+            if int(row['section']) != section:
+                held.append(row)
+                return
+            yield _section_row(section, row)
+
+    return tuple(section_rows(section) for section in range(len(REPORT_SECTIONS)))
+
+
+# Exported columns per log, in sheet/file order
+EXPORT_TABLES = {
+    'meals': ('meal_logs', ('date', 'name', 'calories', 'protein', 'carbs', 'fat', 'notes')),
+    'workouts': ('workout_logs', ('date', 'type', 'duration', 'calories_burned', 'notes')),
+    'weights': ('weight_logs', ('date', 'weight', 'notes')),
+}
+
+
+def log_rows_query(kind, user_id, start_day, end_day):
+    """Returns (query, params) for one log's rows between two days, inclusive, oldest first."""
+    table, columns = EXPORT_TABLES[kind]
+    start, end = day_range(start_day, end_day)
+    query = (f"SELECT {', '.join(columns)} FROM {table} "
+             f"WHERE user_id = %s AND date >= %s AND date < %s ORDER BY date")
+    return query, (user_id, start, end)
+
+
+def iter_log_rows(kind, user_id, start_day, end_day):
+    """Streams one log's rows from the database; nothing is fetched until iteration starts."""
+    query, params = log_rows_query(kind, user_id, start_day, end_day)
+    return db.stream_query(query, params)
+
+
+def weekly_summary_data(user_id, end_day, days=7):
+    """
+    Totals from the rollup plus the first and last weigh-in of the period, in
+    one query. Returns a dict of floats (weights are None without weigh-ins).
+    """
+    start_day = end_day - timedelta(days=days - 1)
+    start, end = day_range(start_day, end_day)
+    row = db.execute_query(
+        """SELECT COALESCE(SUM(calories_in), 0) AS calories_in,
+                  COALESCE(SUM(meal_count), 0) AS meal_count,
+                  COALESCE(SUM(calories_burned), 0) AS calories_burned,
+                  COALESCE(SUM(workout_minutes), 0) AS workout_minutes,
+                  COALESCE(SUM(workout_count), 0) AS workout_count,
+                  (SELECT weight FROM weight_logs WHERE user_id = %s AND date >= %s AND date < %s
+                   ORDER BY date LIMIT 1) AS start_weight,
+                  (SELECT weight FROM weight_logs WHERE user_id = %s AND date >= %s AND date < %s
+                   ORDER BY date DESC LIMIT 1) AS end_weight
+           FROM daily_user_stats
+           WHERE user_id = %s AND stat_date BETWEEN %s AND %s""",
+        (user_id, start, end, user_id, start, end, user_id, start_day, end_day),
+        fetch_one=True
+    )
+    return {key: float(value) if value is not None else None for key, value in row.items()}
@@ -0,0 +1,253 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from database import db
+from streaks import record_meal_day, record_meal_days, recompute_streak
+from sync_log import next_sync_seq, record_deletion
+
+
+# Rollup upserts for daily_user_stats (created in Database.initialize_db).
+# Kept in step with the raw logs by the insert helpers below so trend and
+# summary views never have to re-aggregate meal_logs/workout_logs.
+_MEAL_ROLLUP = """
+    INSERT INTO daily_user_stats (user_id, stat_date, calories_in, protein, carbs, fat, meal_count)
+    VALUES (%s, %s, %s, %s, %s, %s, 1)
+    ON DUPLICATE KEY UPDATE
+        calories_in = calories_in + VALUES(calories_in),
+        protein = protein + VALUES(protein),
+        carbs = carbs + VALUES(carbs),
+        fat = fat + VALUES(fat),
+        meal_count = meal_count + 1
+"""
+
+_WORKOUT_ROLLUP = """
+    INSERT INTO daily_user_stats (user_id, stat_date, calories_burned, workout_minutes, workout_count)
+    VALUES (%s, %s, %s, %s, 1)
+    ON DUPLICATE KEY UPDATE
+        calories_burned = calories_burned + VALUES(calories_burned),
+        workout_minutes = workout_minutes + VALUES(workout_minutes),
+        workout_count = workout_count + 1
+"""
+
+
+def add_meal(cursor, user_id, name, calories, protein=None, carbs=None, fat=None, notes=None, date=None, seq=None):
+    """
+    Inserts a meal log and updates the rollup and streak on the caller's
+    transaction. Returns the new meal id.
+    """
+    date = date or datetime.utcnow()
+    seq = seq or next_sync_seq(cursor, user_id, kinds=('meal',))
+    cursor.execute(
+        """INSERT INTO meal_logs (user_id, name, calories, protein, carbs, fat, notes, date, sync_seq)
+           VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+        (user_id, name, calories, protein, carbs, fat, notes, date, seq)
+    )
+    meal_id = cursor.lastrowid
+    cursor.execute(_MEAL_ROLLUP, (user_id, date.date(), calories or 0, protein or 0, carbs or 0, fat or 0))
+    record_meal_day(cursor, user_id, date.date())
+    return meal_id
+
+
+def add_workout(cursor, user_id, workout_type, duration=None, calories_burned=None, notes=None, date=None, seq=None):
+    """Inserts a workout log and updates the rollup on the caller's transaction. Returns the new id."""
+    date = date or datetime.utcnow()
+    seq = seq or next_sync_seq(cursor, user_id, kinds=('workout',))
+    cursor.execute(
+        """INSERT INTO workout_logs (user_id, type, duration, calories_burned, notes, date, sync_seq)
+           VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+        (user_id, workout_type, duration, calories_burned, notes, date, seq)
+    )
+    workout_id = cursor.lastrowid
+    cursor.execute(_WORKOUT_ROLLUP, (user_id, date.date(), calories_burned or 0, duration or 0))
+    return workout_id
+
+
+def add_weight(cursor, user_id, weight, notes=None, date=None, seq=None):
+    """Inserts a weight log on the caller's transaction. Returns the new id."""
+    date = date or datetime.utcnow()
+    seq = seq or next_sync_seq(cursor, user_id, kinds=('weight',))
+    cursor.execute(
+        "INSERT INTO weight_logs (user_id, weight, notes, date, sync_seq) VALUES (%s, %s, %s, %s, %s)",
+        (user_id, weight, notes, date, seq)
+    )
+    return cursor.lastrowid
+
+
+def insert_meal(user_id, name, calories, protein=None, carbs=None, fat=None, notes=None, date=None):
+    """Inserts a meal log and updates the daily rollup in the same transaction."""
+    with db.get_cursor(commit=True) as cursor:
+        return add_meal(cursor, user_id, name, calories, protein, carbs, fat, notes, date)
+
+
+def insert_workout(user_id, workout_type, duration=None, calories_burned=None, notes=None, date=None):
+    """Inserts a workout log and updates the daily rollup in the same transaction."""
+    with db.get_cursor(commit=True) as cursor:
+        return add_workout(cursor, user_id, workout_type, duration, calories_burned, notes, date)
+
+
+def insert_weight(user_id, weight, notes=None, date=None):
+    """Inserts a weight log."""
+    with db.get_cursor(commit=True) as cursor:
+        return add_weight(cursor, user_id, weight, notes, date)
+
+
+# Batch variants of the rollup upserts: one row per day carrying the day's sums and counts
+_MEAL_ROLLUP_BATCH = """
+    INSERT INTO daily_user_stats (user_id, stat_date, calories_in, protein, carbs, fat, meal_count)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        calories_in = calories_in + VALUES(calories_in),
+        protein = protein + VALUES(protein),
+        carbs = carbs + VALUES(carbs),
+        fat = fat + VALUES(fat),
+        meal_count = meal_count + VALUES(meal_count)
+"""
+
+_WORKOUT_ROLLUP_BATCH = """
+    INSERT INTO daily_user_stats (user_id, stat_date, calories_burned, workout_minutes, workout_count)
+    VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        calories_burned = calories_burned + VALUES(calories_burned),
+        workout_minutes = workout_minutes + VALUES(workout_minutes),
+        workout_count = workout_count + VALUES(workout_count)
+"""
+
+
+def insert_logs_batch(user_id, meals=(), workouts=()):
+    """
+    Inserts many meal/workout logs in one transaction. Each list is written
+    with executemany (which the connector turns into a multi-row INSERT), and
+    the rollup gets one upsert per affected day instead of one per item.
+
+    Items are dicts with the insert_meal/insert_workout fields: meals need
+    name and calories (protein, carbs, fat, notes, date optional); workouts
+    need type (duration, calories_burned, notes, date optional).
+    Returns (meals_inserted, workouts_inserted).
+    """
+    now = datetime.utcnow()
+    meal_rows, workout_rows = [], []
+    meal_days = defaultdict(lambda: [0, 0, 0, 0, 0])
+    workout_days = defaultdict(lambda: [0, 0, 0])
+    for meal in meals:
+        date = meal.get('date') or now
+        meal_rows.append((user_id, meal['name'], meal['calories'], meal.get('protein'), meal.get('carbs'),
+                          meal.get('fat'), meal.get('notes'), date))
+        day = meal_days[date.date()]
+        for i, key in enumerate(('calories', 'protein', 'carbs', 'fat')):
+            day[i] += meal.get(key) or 0
+        day[4] += 1
+    for workout in workouts:
+        date = workout.get('date') or now
+        workout_rows.append((user_id, workout['type'], workout.get('duration'), workout.get('calories_burned'),
+                             workout.get('notes'), date))
+        day = workout_days[date.date()]
+        day[0] += workout.get('calories_burned') or 0
+        day[1] += workout.get('duration') or 0
+        day[2] += 1
+
+    with db.get_cursor(commit=True) as cursor:
+        if not meal_rows and not workout_rows:
+            return 0, 0
+        kinds = ('meal',) * bool(meal_rows) + ('workout',) * bool(workout_rows)
+        seq = next_sync_seq(cursor, user_id, len(meal_rows) + len(workout_rows), kinds)
+        meal_rows = [row + (seq + i,) for i, row in enumerate(meal_rows)]
+        workout_rows = [row + (seq + len(meal_rows) + i,) for i, row in enumerate(workout_rows)]
+        if meal_rows:
+            cursor.executemany(
+                """INSERT INTO meal_logs (user_id, name, calories, protein, carbs, fat, notes, date, sync_seq)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+                meal_rows
+            )
+            cursor.executemany(_MEAL_ROLLUP_BATCH, [(user_id, day, *sums) for day, sums in meal_days.items()])
+            record_meal_days(cursor, user_id, meal_days.keys())
+        if workout_rows:
+            cursor.executemany(
+                """INSERT INTO workout_logs (user_id, type, duration, calories_burned, notes, date, sync_seq)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+                workout_rows
+            )
+            cursor.executemany(_WORKOUT_ROLLUP_BATCH, [(user_id, day, *sums) for day, sums in workout_days.items()])
+    return len(meal_rows), len(workout_rows)
+
+
+def delete_meal(user_id, meal_id):
+    """Deletes a meal log, backs it out of the rollup and recomputes the streak."""
+    with db.get_cursor(commit=True) as cursor:
+        cursor.execute(
+            "SELECT calories, protein, carbs, fat, date FROM meal_logs WHERE id = %s AND user_id = %s FOR UPDATE",
+            (meal_id, user_id)
+        )
+        meal = cursor.fetchone()
+        if not meal:
+            return False
+        cursor.execute("DELETE FROM meal_logs WHERE id = %s", (meal_id,))
+        record_deletion(cursor, user_id, 'meal', meal_id)
+        cursor.execute(
+            """UPDATE daily_user_stats SET
+                   calories_in = calories_in - %s, protein = protein - %s,
+                   carbs = carbs - %s, fat = fat - %s, meal_count = meal_count - 1
+               WHERE user_id = %s AND stat_date = %s""",
+            (meal['calories'] or 0, meal['protein'] or 0, meal['carbs'] or 0, meal['fat'] or 0,
+             user_id, meal['date'].date())
+        )
+        # In the same transaction, so no reader sees the new data version with the old streak
+        recompute_streak(user_id, cursor)
+    return True
+
+
+def get_daily_stats(user_id, start_day, end_day):
+    """Returns one rollup row per day that has activity in [start_day, end_day]."""
+    return db.execute_query(
+        """SELECT * FROM daily_user_stats
+           WHERE user_id = %s AND stat_date BETWEEN %s AND %s
+           ORDER BY stat_date""",
+        (user_id, start_day, end_day),
+        fetch_all=True
+    ) or []
+
+
+def get_daily_series(user_id, start_day, end_day, column):
+    """Returns (days, values) for a rollup column with zeros for days without logs."""
+    rows = {row['stat_date']: float(row[column] or 0) for row in get_daily_stats(user_id, start_day, end_day)}
+    days = [start_day + timedelta(days=i) for i in range((end_day - start_day).days + 1)]
+    return days, [rows.get(day, 0.0) for day in days]
+
+
+def rebuild_daily_stats(user_id=None):
+    """
+    Recomputes daily_user_stats from the raw log tables, for one user or everyone.
+    Used to backfill the rollup and to repair it after manual data fixes.
+    """
+    user_filter = "WHERE user_id = %s" if user_id is not None else ""
+    params = (user_id,) if user_id is not None else ()
+    with db.get_cursor(commit=True) as cursor:
+        cursor.execute(f"DELETE FROM daily_user_stats {user_filter}", params)
+        cursor.execute(f"""
+            INSERT INTO daily_user_stats (user_id, stat_date, calories_in, protein, carbs, fat, meal_count)
+            SELECT user_id, DATE(date), SUM(calories), COALESCE(SUM(protein), 0),
+                   COALESCE(SUM(carbs), 0), COALESCE(SUM(fat), 0), COUNT(*)
+            FROM meal_logs {user_filter}
+            GROUP BY user_id, DATE(date)
+        """, params)
+        cursor.execute(f"""
+            INSERT INTO daily_user_stats (user_id, stat_date, calories_burned, workout_minutes, workout_count)
+            SELECT user_id, DATE(date), COALESCE(SUM(calories_burned), 0), COALESCE(SUM(duration), 0), COUNT(*)
+            FROM workout_logs {user_filter}
+            GROUP BY user_id, DATE(date)
+            ON DUPLICATE KEY UPDATE
+                calories_burned = VALUES(calories_burned),
+                workout_minutes = VALUES(workout_minutes),
+                workout_count = VALUES(workout_count)
+        """, params)
+        # Streaks are derived from the rollup; drop them so they re-initialise lazily
+        cursor.execute(f"DELETE FROM user_streaks {user_filter}", params)
+        # Move the data versions so cached dashboard sections built from the old
+        # rollup or streak are rebuilt, in every worker (see dashboard_cache.py)
+        if user_id is not None:
+            user_ids = [user_id]
+        else:
+            cursor.execute("SELECT id FROM users")
+            user_ids = [row['id'] for row in cursor.fetchall()]
+        for uid in user_ids:
+            next_sync_seq(cursor, uid, kinds=('meal', 'workout', 'weight'))
+        cursor.execute(f"SELECT COUNT(*) AS n FROM daily_user_stats {user_filter}", params)
+        return cursor.fetchone()['n']
@@ -3,6 +3,10 @@ document.addEventListener('DOMContentLoaded', function () {
     const charts = document.querySelectorAll('.chart-container canvas');
 
     charts.forEach(chartElement => {
+        if (chartElement.dataset.chartSrc) {
+            loadRemoteChart(chartElement);
+            return;
+        }
         const ctx = chartElement.getContext('2d');
         const chartType = chartElement.dataset.chartType || 'line';
         const chartData = JSON.parse(chartElement.dataset.chartData || '{}');
@@ -21,4 +25,40 @@ document.addEventListener('DOMContentLoaded', function () {
             }
         });
     });
-});
\ No newline at end of file
+});
+
+// Draws a line chart from a columnar /api/chart-data response:
+// { dates: [...], <field>: [...] }
+function loadRemoteChart(chartElement) {
+    fetch(chartElement.dataset.chartSrc, { credentials: 'same-origin' })
+        .then(response => response.json())
+        .then(data => {
+            const values = data[chartElement.dataset.chartField] || [];
+            if (!data.success || !values.some(v => v > 0)) {
+                const message = document.createElement('p');
+                message.style.cssText = 'text-align: center; padding: 4rem 1rem;';
+                message.textContent = chartElement.dataset.chartEmpty || 'No data yet.';
+                chartElement.replaceWith(message);
+                return;
+            }
+            new Chart(chartElement.getContext('2d'), {
+                type: 'line',
+                data: {
+                    labels: data.dates,
+                    datasets: [{
+                        label: chartElement.dataset.chartLabel,
+                        data: values,
+                        borderColor: chartElement.dataset.chartColor,
+                        backgroundColor: chartElement.dataset.chartColor,
+                        tension: 0.2
+                    }]
+                },
+                options: {
+                    responsive: true,
+                    maintainAspectRatio: false,
+                    scales: { y: { beginAtZero: false } }
+                }
+            });
+        })
+        .catch(error => console.error('Chart data error:', error));
+}
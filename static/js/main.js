@@ -120,24 +120,51 @@ document.addEventListener('DOMContentLoaded', function () {
         addMessage('...', 'assistant', true);
 
         try {
-            const response = await fetch('/api/chat', {
+            const response = await fetch('/api/chat/stream', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({ prompt: prompt })
             });
-            const data = await response.json();
-
-            // Remove typing indicator and show AI response
-            document.querySelector('.typing-indicator').remove();
-            addMessage(data.reply, 'assistant');
+            if (!response.ok || !response.body) throw new Error(`HTTP ${response.status}`);
+
+            // Render tokens as they arrive; the first one replaces the typing indicator
+            let messageDiv = null;
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                const events = buffer.split('\n\n');
+                buffer = events.pop();
+                for (const event of events) {
+                    if (!event.startsWith('data: ')) continue;
+                    const data = JSON.parse(event.slice(6));
+                    if (data.token) {
+                        if (!messageDiv) {
+                            removeTypingIndicator();
+                            messageDiv = addMessage('', 'assistant');
+                        }
+                        messageDiv.textContent += data.token;
+                        messagesContainer.scrollTop = messagesContainer.scrollHeight;
+                    }
+                }
+            }
+            removeTypingIndicator();
 
         } catch (error) {
-            document.querySelector('.typing-indicator').remove();
+            removeTypingIndicator();
             addMessage('Error connecting to the assistant.', 'assistant');
             console.error('Chat error:', error);
         }
     });
 
+    function removeTypingIndicator() {
+        const indicator = document.querySelector('.typing-indicator');
+        if (indicator) indicator.remove();
+    }
+
     function addMessage(text, role, isTyping = false) {
         const messageDiv = document.createElement('div');
         messageDiv.className = `ai-chat-message ${role}`;
@@ -149,5 +176,6 @@ document.addEventListener('DOMContentLoaded', function () {
         }
         messagesContainer.appendChild(messageDiv);
         messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        return messageDiv;
     }
 });
\ No newline at end of file
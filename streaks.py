@@ -0,0 +1,159 @@
+from datetime import timedelta
+from database import db
+
+
+# Streak = length of the most recent run of consecutive days with at least one
+# meal logged (the same definition the old window-function query used).
+# State lives in user_streaks and is advanced in O(1) when a meal is logged
+# for the latest day; backdated inserts and deletions fall back to a recompute
+# over the daily_user_stats rollup, which has at most one row per day.
+
+STREAK_CTE = """
+    WITH DateSeries AS (
+        SELECT DISTINCT DATE(date) as log_date FROM meal_logs WHERE user_id = %s
+    ),
+    DateGroups AS (
+        SELECT log_date, DATE_SUB(log_date, INTERVAL DENSE_RANK() OVER (ORDER BY log_date) DAY) as grp
+        FROM DateSeries
+    )
+    SELECT COUNT(*) as streak_length FROM DateGroups WHERE grp = (SELECT grp FROM DateGroups ORDER BY log_date DESC LIMIT 1)
+"""
+
+
+def _save_state(cursor, user_id, current, longest, last_active, streak_start):
+    cursor.execute(
+        """INSERT INTO user_streaks (user_id, current_streak, longest_streak, last_active_date, streak_start_date)
+           VALUES (%s, %s, %s, %s, %s)
+           ON DUPLICATE KEY UPDATE
+               current_streak = VALUES(current_streak),
+               longest_streak = VALUES(longest_streak),
+               last_active_date = VALUES(last_active_date),
+               streak_start_date = VALUES(streak_start_date)""",
+        (user_id, current, longest, last_active, streak_start)
+    )
+
+
+def _recompute(cursor, user_id):
+    """Rebuilds the streak state from the rollup's meal days."""
+    cursor.execute(
+        """SELECT stat_date FROM daily_user_stats
+           WHERE user_id = %s AND meal_count > 0
+           ORDER BY stat_date""",
+        (user_id,)
+    )
+    days = [row['stat_date'] for row in cursor.fetchall()]
+
+    current = longest = 0
+    streak_start = last_active = None
+    for day in days:
+        if last_active is not None and day == last_active + timedelta(days=1):
+            current += 1
+        else:
+            current = 1
+            streak_start = day
+        last_active = day
+        longest = max(longest, current)
+
+    _save_state(cursor, user_id, current, longest, last_active, streak_start)
+    return current
+
+
+def record_meal_day(cursor, user_id, day):
+    """
+    Advances the streak for a meal logged on `day`. Must run on the same cursor
+    (transaction) as the daily_user_stats upsert for that meal.
+    """
+    cursor.execute(
+        "SELECT * FROM user_streaks WHERE user_id = %s FOR UPDATE",
+        (user_id,)
+    )
+    state = cursor.fetchone()
+    if not state or state['last_active_date'] is None:
+        _recompute(cursor, user_id)
+        return
+
+    last_active = state['last_active_date']
+    if day == last_active:
+        return
+    if day == last_active + timedelta(days=1):
+        current = state['current_streak'] + 1
+        _save_state(cursor, user_id, current, max(current, state['longest_streak']),
+                    day, state['streak_start_date'])
+    elif day > last_active:
+        _save_state(cursor, user_id, 1, max(1, state['longest_streak']), day, day)
+    elif state['streak_start_date'] <= day:
+        # Already inside the current run, nothing changes
+        return
+    else:
+        # Backdated meal: it may bridge a gap and join older runs
+        _recompute(cursor, user_id)
+
+
+def record_meal_days(cursor, user_id, days):
+    """
+    Batch form of record_meal_day for meals inserted together: a single day
+    takes the O(1) path, several days are settled with one recompute.
+    """
+    days = sorted(set(days))
+    if len(days) == 1:
+        record_meal_day(cursor, user_id, days[0])
+    elif days:
+        _recompute(cursor, user_id)
+
+
+def recompute_streak(user_id, cursor=None):
+    """Recomputes one user's streak state (after deletions or manual edits), on `cursor`'s transaction if given."""
+    if cursor is not None:
+        return _recompute(cursor, user_id)
+    with db.get_cursor(commit=True) as cursor:
+        return _recompute(cursor, user_id)
+
+
+def get_streak(user_id):
+    """Returns the stored streak state, initialising it on first use."""
+    state = db.execute_query(
+        "SELECT current_streak, longest_streak, last_active_date FROM user_streaks WHERE user_id = %s",
+        (user_id,),
+        fetch_one=True
+    )
+    if state:
+        return state
+    recompute_streak(user_id)
+    return db.execute_query(
+        "SELECT current_streak, longest_streak, last_active_date FROM user_streaks WHERE user_id = %s",
+        (user_id,),
+        fetch_one=True
+    )
+
+
+def calculate_streak_cte(user_id):
+    """The original full-history window-function query, kept as the reference for repair checks."""
+    result = db.execute_query(STREAK_CTE, (user_id,), fetch_one=True)
+    return result['streak_length'] if result and result['streak_length'] is not None else 0
+
+
+def verify_streaks(user_id=None, fix=False):
+    """
+    Compares stored streaks against the reference CTE. Returns a list of
+    (user_id, stored, expected) mismatches; with fix=True they are recomputed.
+    """
+    if user_id is not None:
+        user_ids = [user_id]
+    else:
+        user_ids = [row['id'] for row in db.execute_query("SELECT id FROM users", fetch_all=True) or []]
+
+    mismatches = []
+    for uid in user_ids:
+        row = db.execute_query(
+            "SELECT current_streak FROM user_streaks WHERE user_id = %s", (uid,), fetch_one=True
+        )
+        stored = row['current_streak'] if row else 0
+        expected = calculate_streak_cte(uid)
+        if stored != expected:
+            mismatches.append((uid, stored, expected))
+            if fix:
+                # The rollup is the recompute source, so repair it first
+                from rollups import rebuild_daily_stats
+                rebuild_daily_stats(uid)
+                recompute_streak(uid)
+    return mismatches
@@ -0,0 +1,193 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from database import db
+from log_import import parse_meal, parse_workout, parse_weight
+from rollups import add_meal, add_workout, add_weight
+from sync_log import lock_sync_state, next_sync_seq
+
+# Offline-first sync for the mobile client. One request carries the entries
+# logged while offline (each with a client-generated idempotency key) and the
+# cursor from the previous sync; the response says what happened to each entry
+# and returns every server-side change after the cursor. Replaying a request
+# is safe: keys already in sync_receipts are reported as duplicates and not
+# inserted again.
+
+SYNC_MAX_ENTRIES = 200
+SYNC_DELTA_LIMIT = 500
+# A first sync (no cursor) returns this much history instead of everything
+SYNC_INITIAL_DAYS = 30
+# Most statements one entry can add (a meal: insert, rollup and streak upkeep), for query budgets
+SYNC_QUERIES_PER_ENTRY = 5
+
+ENTRY_TYPES = ('meal', 'workout', 'weight')
+
+# All three logs plus deletions, in one shape, in sequence order
+_CHANGES = """
+    SELECT 'meal' AS entry_type, 'upsert' AS op, id, sync_seq AS seq, date, name AS label, calories AS amount,
+           protein, carbs, fat, NULL AS duration, NULL AS weight, notes
+    FROM meal_logs WHERE user_id = %s AND {meal_filter}
+    UNION ALL
+    SELECT 'workout', 'upsert', id, sync_seq, date, type, calories_burned, NULL, NULL, NULL, duration, NULL, notes
+    FROM workout_logs WHERE user_id = %s AND {workout_filter}
+    UNION ALL
+    SELECT 'weight', 'upsert', id, sync_seq, date, NULL, NULL, NULL, NULL, NULL, NULL, weight, notes
+    FROM weight_logs WHERE user_id = %s AND {weight_filter}
+    {tombstones}
+    ORDER BY seq
+"""
+
+_TOMBSTONES = """
+    UNION ALL
+    SELECT entry_type, 'delete', log_id, seq, NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL, NULL
+    FROM sync_tombstones WHERE user_id = %s AND seq > %s
+"""
+
+
+def parse_entries(entries):
+    """Validates the client's entries; returns [(key, entry_type, fields)] or raises ValueError."""
+    if not isinstance(entries, list):
+        raise ValueError("entries must be a list")
+    if len(entries) > SYNC_MAX_ENTRIES:
+        raise ValueError(f"at most {SYNC_MAX_ENTRIES} entries per sync")
+    parsed, seen = [], set()
+    for index, entry in enumerate(entries):
+        try:
+            if not isinstance(entry, dict):
+                raise ValueError("must be an object")
+            key = str(entry.get('idempotency_key') or '').strip()
+            if not key or len(key) > 64:
+                raise ValueError("idempotency_key must be 1-64 characters")
+            if key in seen:
+                raise ValueError("duplicate idempotency_key in this batch")
+            seen.add(key)
+            entry_type = entry.get('type')
+            if entry_type == 'meal':
+                fields = parse_meal(entry)
+            elif entry_type == 'workout':
+                fields = parse_workout(dict(entry, type=entry.get('workout_type') or entry.get('name')))
+            elif entry_type == 'weight':
+                fields = parse_weight(entry)
+            else:
+                raise ValueError(f"type must be one of {', '.join(ENTRY_TYPES)}")
+            # Entries keep the time they were logged on the device
+            fields['date'] = fields['date'] or datetime.utcnow()
+            parsed.append((key, entry_type, fields))
+        except ValueError as e:
+            raise ValueError(f"entry {index}: {e}")
+    return parsed
+
+
+def apply_entries(user_id, entries):
+    """
+    Inserts the entries whose idempotency keys are new, all in one transaction.
+    Returns [{'idempotency_key', 'type', 'id', 'status': 'created'|'duplicate'}].
+    """
+    if not entries:
+        return []
+    results = []
+    with db.get_cursor(commit=True) as cursor:
+        # Locking the user's sync row first makes a concurrent replay of the
+        # same batch wait here and then see our receipts
+        lock_sync_state(cursor, user_id)
+        keys = [key for key, _, _ in entries]
+        cursor.execute(
+            f"""SELECT idempotency_key, entry_type, log_id FROM sync_receipts
+                WHERE user_id = %s AND idempotency_key IN ({', '.join(['%s'] * len(keys))})
+                FOR UPDATE""",
+            (user_id, *keys)
+        )
+        existing = {row['idempotency_key']: row for row in cursor.fetchall()}
+
+        # Only new entries take sequence numbers and move data versions, so a
+        # pure replay leaves the user's cached dashboard sections alone
+        new_entries = [entry for entry in entries if entry[0] not in existing]
+        if new_entries:
+            seq = next_sync_seq(cursor, user_id, len(new_entries),
+                                sorted({entry_type for _, entry_type, _ in new_entries}))
+        offsets = {key: offset for offset, (key, _, _) in enumerate(new_entries)}
+
+        receipts = []
+        for key, entry_type, fields in entries:
+            if key in existing:
+                row = existing[key]
+                results.append({'idempotency_key': key, 'type': row['entry_type'], 'id': row['log_id'],
+                                'status': 'duplicate'})
+                continue
+            offset = offsets[key]
+            if entry_type == 'meal':
+                log_id = add_meal(cursor, user_id, seq=seq + offset, **fields)
+            elif entry_type == 'workout':
+                log_id = add_workout(cursor, user_id, fields['type'], fields['duration'], fields['calories_burned'],
+                                     fields['notes'], fields['date'], seq=seq + offset)
+            else:
+                log_id = add_weight(cursor, user_id, seq=seq + offset, **fields)
+            receipts.append((user_id, key, entry_type, log_id))
+            results.append({'idempotency_key': key, 'type': entry_type, 'id': log_id, 'status': 'created'})
+
+        if receipts:
+            cursor.executemany(
+                "INSERT INTO sync_receipts (user_id, idempotency_key, entry_type, log_id) VALUES (%s, %s, %s, %s)",
+                receipts
+            )
+    return results
+
+
+def _change(row):
+    change = {'type': row['entry_type'], 'op': row['op'], 'id': row['id']}
+    if row['op'] == 'delete':
+        return change
+    change.update(date=row['date'].isoformat(), notes=row['notes'])
+    if row['entry_type'] == 'meal':
+        change.update(name=row['label'], calories=row['amount'], protein=row['protein'],
+                      carbs=row['carbs'], fat=row['fat'])
+    elif row['entry_type'] == 'workout':
+        change.update(workout_type=row['label'], duration=row['duration'], calories_burned=row['amount'])
+    else:
+        change.update(weight=row['weight'])
+    for key, value in change.items():
+        if isinstance(value, Decimal):
+            change[key] = float(value)
+    return change
+
+
+def get_changes(user_id, cursor_value=None, limit=SYNC_DELTA_LIMIT):
+    """
+    Returns (changes, next_cursor, has_more). With a cursor: every insert and
+    deletion after it, oldest first, at most `limit`. Without one: the last
+    SYNC_INITIAL_DAYS of logs, and a cursor for the next call.
+    """
+    # Both reads share one snapshot, so the cursor matches the rows
+    with db.get_cursor(snapshot=True) as cursor:
+        cursor.execute("SELECT seq FROM user_sync_state WHERE user_id = %s", (user_id,))
+        state = cursor.fetchone()
+        current = state['seq'] if state else 0
+
+        if cursor_value is None:
+            since = datetime.utcnow() - timedelta(days=SYNC_INITIAL_DAYS)
+            query = _CHANGES.format(meal_filter="date >= %s", workout_filter="date >= %s",
+                                    weight_filter="date >= %s", tombstones="")
+            cursor.execute(query, (user_id, since) * 3)
+            return [_change(row) for row in cursor.fetchall()], str(current), False
+
+        query = _CHANGES.format(meal_filter="sync_seq > %s", workout_filter="sync_seq > %s",
+                                weight_filter="sync_seq > %s", tombstones=_TOMBSTONES) + " LIMIT %s"
+        cursor.execute(query, (user_id, cursor_value) * 4 + (limit + 1,))
+        rows = cursor.fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = rows[-1]['seq'] if has_more else max(current, cursor_value)
+    return [_change(row) for row in rows], str(next_cursor), has_more
+
+
+def parse_cursor(value):
+    if value in (None, ''):
+        return None
+    try:
+        cursor_value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("cursor must be a value returned by a previous sync")
+    if cursor_value < 0:
+        raise ValueError("cursor must be a value returned by a previous sync")
+    return cursor_value
@@ -0,0 +1,51 @@
+# Per-user change sequence for offline sync (see sync.py).
+#
+# Every write to meal_logs/workout_logs/weight_logs takes the next number from
+# the user's counter in user_sync_state and stores it in the row's sync_seq;
+# deletions leave a row in sync_tombstones with their own number. Bumping the
+# counter locks the user's row until commit, so one user's writes get numbers
+# in commit order and "everything with sync_seq > cursor" never skips a row.
+#
+# The same row also keeps, per kind of data, the number of the last change of
+# that kind (meal_seq, workout_seq, ...). Those are the data versions the
+# dashboard cache keys its sections on (see dashboard_cache.py).
+
+DATA_KINDS = ('meal', 'workout', 'weight', 'profile')
+
+
+def next_sync_seq(cursor, user_id, count=1, kinds=()):
+    """
+    Reserves `count` sequence numbers for the user on the caller's transaction
+    and returns the first one. `kinds` (from DATA_KINDS) are the kinds of data
+    the caller is changing; their versions move to the new sequence number.
+    """
+    columns = [f"{kind}_seq" for kind in kinds if kind in DATA_KINDS]
+    # MySQL applies the assignments left to right, so `x_seq = seq` sees the new seq
+    cursor.execute(
+        f"""INSERT INTO user_sync_state (user_id, seq{''.join(', ' + c for c in columns)})
+            VALUES (%s, %s{', %s' * len(columns)})
+            ON DUPLICATE KEY UPDATE seq = seq + VALUES(seq){''.join(f', {c} = seq' for c in columns)}""",
+        (user_id, count) + (count,) * len(columns)
+    )
+    cursor.execute("SELECT seq FROM user_sync_state WHERE user_id = %s", (user_id,))
+    return cursor.fetchone()['seq'] - count + 1
+
+
+def lock_sync_state(cursor, user_id):
+    """
+    Locks the user's sync row until commit without taking a number or moving
+    any version (creating the row if needed), so concurrent writers queue up.
+    """
+    cursor.execute(
+        "INSERT INTO user_sync_state (user_id, seq) VALUES (%s, 0) ON DUPLICATE KEY UPDATE seq = seq",
+        (user_id,)
+    )
+
+
+def record_deletion(cursor, user_id, entry_type, log_id):
+    """Leaves a tombstone so clients that synced the row learn it is gone."""
+    seq = next_sync_seq(cursor, user_id, kinds=(entry_type,))
+    cursor.execute(
+        "INSERT INTO sync_tombstones (user_id, seq, entry_type, log_id) VALUES (%s, %s, %s, %s)",
+        (user_id, seq, entry_type, log_id)
+    )